@@ -1,8 +1,23 @@
-from django.contrib import admin
+import datetime
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.auth import admin as auth_admin
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Count, Sum
+from django.forms.models import BaseInlineFormSet
+from django.http import QueryDict
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+from django.utils.translation import ngettext
 
 # Register your models here.
 
-from .models import Author, Genre, Movie, MovieInstance, Language
+from . import autocomplete, counters, loans
+from .forms import RenewMovieForm
+from .models import Author, Genre, Movie, MovieInstance, Language, StatusChange
 
 """Minimal registration of Models.
 admin.site.register(Movie)
@@ -12,58 +27,289 @@ admin.site.register(Genre)
 admin.site.register(Language)
 """
 
-admin.site.register(Genre)
-admin.site.register(Language)
+class PrefixAutocompleteMixin:
+    """ModelAdmin mixin answering the autocomplete widgets of the other admins with an
+    indexed prefix search of prefix_search_fields (see catalog.autocomplete).
+
+    The changelist search box keeps the usual search of search_fields.
+    """
+    prefix_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if request.resolver_match is not None and request.resolver_match.url_name == 'autocomplete':
+            return autocomplete.prefix_search(queryset, self.prefix_search_fields, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Genre)
+class GenreAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
+    search_fields = prefix_search_fields = ('name',)
+
+
+@admin.register(Language)
+class LanguageAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
+    search_fields = prefix_search_fields = ('name',)
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(PrefixAutocompleteMixin, auth_admin.UserAdmin):
+    """The auth app's UserAdmin, autocompleting borrowers by username."""
+    prefix_search_fields = ('username',)
+
+
+class CounterPaginator(Paginator):
+    """Paginator reading the count of an unfiltered changelist from the materialized counters.
+
+    The counters (see catalog.counters) are read with one indexed query instead
+    of a COUNT(*) scanning the whole table; filtered changelists are counted.
+    """
+
+    @cached_property
+    def count(self):
+        name = counters.MODEL_COUNTERS.get(self.object_list.model)
+        if name is not None and not self.object_list.query.where:
+            return counters.read()[name]
+        return super().count
+
+
+class CatalogModelAdmin(admin.ModelAdmin):
+    """Base administration object for the large catalog tables.
+
+    The changelist is counted with CounterPaginator, and not counted a second time
+    without the filters (show_full_result_count).
+    """
+    paginator = CounterPaginator
+    show_full_result_count = False
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing one page (page_number) of the related rows.
+
+    A submitted formset edits the rows whose ids were posted, rather than the rows
+    at the page's offset now, which differ if rows were added or deleted meanwhile.
+    """
+    per_page = 20
+    page_number = 1
+    page_param = 'page'
+    query_params = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            # A unique ordering, so that the pages do not overlap.
+            queryset = queryset.order_by(*(queryset.query.order_by or self.model._meta.ordering), 'pk')
+            self.page = Paginator(queryset, self.per_page).get_page(self.page_number)
+            if self.is_bound:
+                self._queryset = queryset.filter(pk__in=self.submitted_ids())
+            else:
+                self._queryset = self.page.object_list
+        return self._queryset
+
+    def submitted_ids(self):
+        pk_field = self.model._meta.pk
+        ids = []
+        for number in range(self.initial_form_count()):
+            try:
+                ids.append(pk_field.to_python(self.data.get('{0}-{1}'.format(self.add_prefix(number), pk_field.name))))
+            except ValidationError:
+                continue
+        return [pk for pk in ids if pk is not None]
+
+    def page_query(self, number):
+        """Returns the query string of the change page showing page number, keeping the other parameters."""
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params[self.page_param] = number
+        return params.urlencode()
 
+    def previous_page_query(self):
+        return self.page_query(self.page.previous_page_number())
 
-class MoviesInline(admin.TabularInline):
-    """Defines format of inline movie insertion (used in AuthorAdmin)"""
+    def next_page_query(self):
+        return self.page_query(self.page.next_page_number())
+
+
+class PaginatedInlineMixin:
+    """InlineModelAdmin mixin showing per_page related rows at a time, with links to the other pages.
+
+    The page is chosen with the <model name>_page query parameter, which the
+    change form keeps when it is posted, so the saved forms match the shown rows.
+    """
+    formset = PaginatedInlineFormSet
+    per_page = 20
+    template = 'admin/catalog/paginated_tabular.html'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = '{0}_page'.format(self.model._meta.model_name)
+        formset.page_number = request.GET.get(formset.page_param, 1)
+        formset.query_params = request.GET.copy()
+        return formset
+
+
+class SummaryModeMixin:
+    """ModelAdmin mixin adding a read-only summary mode (?summary=1) to the change page.
+
+    The inlines are left out, so only the read-only fields that aggregate the
+    related rows remain; a link in the object tools switches between the modes.
+    """
+    change_form_template = 'admin/catalog/summary_change_form.html'
+
+    def is_summary_mode(self, request):
+        return request.GET.get('summary') == '1'
+
+    def get_inlines(self, request, obj):
+        return [] if self.is_summary_mode(request) else super().get_inlines(request, obj)
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = {**(extra_context or {}), 'summary_mode': self.is_summary_mode(request)}
+        return super().change_view(request, object_id, form_url, extra_context)
+
+
+class MoviesInline(PaginatedInlineMixin, admin.TabularInline):
+    """Defines format of inline movie insertion (used in AuthorAdmin), a page at a time"""
     model = Movie
+    autocomplete_fields = ('language', 'genre')
 
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(SummaryModeMixin, PrefixAutocompleteMixin, CatalogModelAdmin):
     """Administration object for Author models.
     Defines:
      - fields to be displayed in list view (list_display)
      - orders fields in detail view (fields),
        grouping the date fields horizontally
-     - adds inline addition of movies in author view (inlines)
+     - adds inline addition of movies in author view (inlines),
+       or just their counts in summary mode (movie_summary)
+     - search by name, by prefix when autocompleting (search_fields)
     """
     list_display = ('last_name',
                     'first_name', 'date_of_birth', 'date_of_death')
-    fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
+    search_fields = prefix_search_fields = ('last_name', 'first_name')
+    fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death'), 'movie_summary']
+    readonly_fields = ('movie_summary',)
     inlines = [MoviesInline]
 
+    @admin.display(description='Movies')
+    def movie_summary(self, obj):
+        if obj.pk is None:
+            return '-'
+        # The copy counts are stored on the movies (see catalog.counters).
+        totals = Movie.objects.filter(author=obj).aggregate(
+            movies=Count('pk'), copies=Sum('total_copies'), available=Sum('available_copies'))
+        movies, copies = totals['movies'], totals['copies'] or 0
+        return '{0}, {1} ({2} available)'.format(
+            ngettext('%d movie', '%d movies', movies) % movies,
+            ngettext('%d copy', '%d copies', copies) % copies, totals['available'] or 0)
+
 
-class MoviesInstanceInline(admin.TabularInline):
-    """Defines format of inline movie instance insertion (used in MovieAdmin)"""
+class MoviesInstanceInline(PaginatedInlineMixin, admin.TabularInline):
+    """Defines format of inline movie instance insertion (used in MovieAdmin), a page at a time"""
     model = MovieInstance
+    autocomplete_fields = ('borrower',)
 
 
-class MovieAdmin(admin.ModelAdmin):
+class MovieAdmin(SummaryModeMixin, PrefixAutocompleteMixin, CatalogModelAdmin):
     """Administration object for Movie models.
     Defines:
-     - fields to be displayed in list view (list_display)
-     - adds inline addition of movie instances in movie view (inlines)
+     - fields to be displayed in list view (list_display),
+       loading the authors and genres of a page up front
+     - adds inline addition of movie instances in movie view (inlines),
+       or just their counts by status in summary mode (copy_summary)
+     - related objects picked with autocompletion (autocomplete_fields)
     """
-    list_display = ('title', 'author', 'display_genre')
+    list_display = ('title', 'author', 'display_genre', 'display_availability')
+    list_select_related = ('author',)
+    search_fields = prefix_search_fields = ('title',)
+    autocomplete_fields = ('author', 'language', 'genre')
+    readonly_fields = ('copy_summary',)
     inlines = [MoviesInstanceInline]
 
+    def get_queryset(self, request):
+        # display_genre slices the prefetched genres instead of querying them per row.
+        return super().get_queryset(request).prefetch_related('genre')
+
+    @admin.display(description='Available', ordering='available_copies')
+    def display_availability(self, obj):
+        return '{0} of {1}'.format(obj.available_copies, obj.total_copies)
+
+    @admin.display(description='Copies')
+    def copy_summary(self, obj):
+        if obj.pk is None:
+            return '-'
+        counts = dict(MovieInstance.objects.filter(movie=obj).order_by().values_list('status').annotate(Count('pk')))
+        by_status = ['{0} {1}'.format(counts[status], label)
+                     for status, label in MovieInstance.LOAN_STATUS if counts.get(status)]
+        copies = sum(counts.values())
+        return '{0}{1}'.format(ngettext('%d copy', '%d copies', copies) % copies,
+                               ': ' + ', '.join(by_status) if by_status else '')
+
 
 admin.site.register(Movie, MovieAdmin)
 
 
 @admin.register(MovieInstance)
-class MovieInstanceAdmin(admin.ModelAdmin):
+class MovieInstanceAdmin(CatalogModelAdmin):
     """Administration object for MovieInstance models.
     Defines:
      - fields to be displayed in list view (list_display)
      - filters that will be displayed in sidebar (list_filter)
      - grouping of fields into sections (fieldsets)
+     - bulk renewal, return, maintenance and availability of the selected
+       copies, each a single UPDATE however many are selected (actions)
+     - movie and borrower picked with autocompletion (autocomplete_fields)
     """
     list_display = ('movie', 'status', 'borrower', 'due_back', 'id')
+    list_select_related = ('movie', 'borrower')
+    autocomplete_fields = ('movie', 'borrower')
     list_filter = ('status', 'due_back')
+    actions = ['renew_loans', 'mark_returned', 'send_to_maintenance', 'make_available']
+
+    @admin.action(description='Renew selected loans', permissions=['mark_returned'])
+    def renew_loans(self, request, queryset):
+        """Asks for a renewal date, then applies it to the selected loans with one UPDATE."""
+        form = RenewMovieForm(request.POST if 'apply' in request.POST else None,
+                              initial={'renewal_date': datetime.date.today() + datetime.timedelta(weeks=3)})
+        if form.is_valid():
+            renewed = loans.renew(queryset, form.cleaned_data['renewal_date'], request.user)
+            self.message_user(request, 'Renewed {0} loan{1} until {2}.'.format(
+                renewed, '' if renewed == 1 else 's', form.cleaned_data['renewal_date']), messages.SUCCESS)
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Renew loans',
+            'opts': self.model._meta,
+            'form': form,
+            'num_loans': queryset.filter(status__exact='o').count(),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/catalog/movieinstance/renew_loans.html', context)
+
+    def apply_transition(self, request, queryset, operation, done):
+        """Applies the loans operation to the selected copies, or to all the copies matching the filters."""
+        changed = operation(queryset, request.user)
+        self.message_user(request, '{0} {1} cop{2}.'.format(done, changed, 'y' if changed == 1 else 'ies'),
+                          messages.SUCCESS if changed else messages.WARNING)
+
+    @admin.action(description='Mark selected copies returned', permissions=['mark_returned'])
+    def mark_returned(self, request, queryset):
+        self.apply_transition(request, queryset, loans.return_copies, 'Returned')
+
+    @admin.action(description='Send selected copies to maintenance', permissions=['mark_returned'])
+    def send_to_maintenance(self, request, queryset):
+        self.apply_transition(request, queryset, loans.send_to_maintenance, 'Sent to maintenance')
+
+    @admin.action(description='Make selected copies available', permissions=['mark_returned'])
+    def make_available(self, request, queryset):
+        self.apply_transition(request, queryset, loans.make_available, 'Made available')
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalog.can_mark_returned')
 
     fieldsets = (
         (None, {
@@ -73,3 +319,20 @@ class MovieInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+
+@admin.register(StatusChange)
+class StatusChangeAdmin(CatalogModelAdmin):
+    """Read-only administration object for the audit trail of the bulk loan operations."""
+    list_display = ('changed_at', 'movie_instance', 'action', 'from_status', 'to_status', 'due_back', 'changed_by')
+    list_select_related = ('movie_instance__movie', 'changed_by')
+    list_filter = ('action', 'changed_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
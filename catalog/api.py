@@ -0,0 +1,122 @@
+"""Read-only JSON API for kiosks and partner applications.
+
+Endpoints (under /catalog/api/): movies, authors, genres and availability.
+They accept ?fields=a,b to select the returned fields, ?limit= for the page
+size and ?cursor= for keyset pagination (see catalog.pagination), and return
+{"results": [...], "next": url, "previous": url}.
+
+Rows are serialized straight from values() querysets, without instantiating
+models or rendering templates.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Author, Genre, Movie
+from .pagination import CursorPage
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class Resource:
+    """Describes an API endpoint: the queryset, its public fields and the cursor ordering.
+
+    fields maps each public field name to the values() lookup it is read from
+    (None for fields filled in separately, like the genres of movies).
+    """
+
+    def __init__(self, queryset, fields, ordering, default_fields=None):
+        self.queryset = queryset
+        self.fields = fields
+        self.ordering = ordering
+        self.default_fields = default_fields or list(fields)
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+
+def movie_genres(movie_ids):
+    """Returns a dict mapping each movie id to its genre names, with a single query."""
+    genres = {}
+    rows = Movie.genre.through.objects.filter(movie_id__in=movie_ids).order_by('genre__name')
+    for movie_id, name in rows.values_list('movie_id', 'genre__name'):
+        genres.setdefault(movie_id, []).append(name)
+    return genres
+
+
+RESOURCES = {
+    'movies': Resource(
+        Movie.objects.all(),
+        fields={'id': 'id', 'title': 'title', 'isbn': 'isbn', 'summary': 'summary', 'author_id': 'author_id',
+                'language': 'language__name', 'genres': None},
+        ordering=('title', 'author_id', 'id'),
+        default_fields=['id', 'title', 'isbn', 'author_id', 'language', 'genres'],
+    ),
+    'authors': Resource(
+        Author.objects.all(),
+        fields={'id': 'id', 'first_name': 'first_name', 'last_name': 'last_name',
+                'date_of_birth': 'date_of_birth', 'date_of_death': 'date_of_death'},
+        ordering=('last_name', 'first_name', 'id'),
+    ),
+    'genres': Resource(
+        Genre.objects.all(),
+        fields={'id': 'id', 'name': 'name'},
+        ordering=('name', 'id'),
+    ),
+    'availability': Resource(
+        Movie.objects.all(),
+        fields={'id': 'id', 'title': 'title', 'total_copies': 'total_copies', 'available_copies': 'available_copies'},
+        ordering=('title', 'author_id', 'id'),
+    ),
+}
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri('{0}?{1}'.format(request.path, query.urlencode()))
+
+
+@require_GET
+def resource_list(request, resource_name):
+    """View function returning a page of a resource as JSON."""
+    resource = RESOURCES[resource_name]
+    fields = [name for name in request.GET.get('fields', '').split(',') if name] or resource.default_fields
+    unknown = [name for name in fields if name not in resource.fields]
+    if unknown:
+        return error('Unknown fields: {0}'.format(', '.join(unknown)))
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        return error('limit must be an integer')
+    if limit < 1:
+        return error('limit must be positive')
+
+    lookups = {resource.fields[name] for name in fields if resource.fields[name]} | set(resource.ordering)
+    queryset = resource.get_queryset().values(*lookups)
+    try:
+        page = CursorPage(queryset, resource.ordering, limit, request.GET.get('cursor'))
+    except Http404:
+        return error('Invalid cursor')
+
+    genres = movie_genres([row['id'] for row in page.object_list]) if 'genres' in fields else {}
+    results = []
+    for row in page.object_list:
+        item = {name: row[resource.fields[name]] for name in fields if resource.fields[name]}
+        if 'genres' in fields:
+            item['genres'] = genres.get(row['id'], [])
+        results.append(item)
+
+    return JsonResponse({
+        'results': results,
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    }, encoder=DjangoJSONEncoder)
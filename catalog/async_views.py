@@ -0,0 +1,121 @@
+"""Async versions of the home page and the movie and author lists.
+
+Enabled with CATALOG_ASYNC_VIEWS = True, best served under ASGI (see
+locallibrary/asgi.py). Each view runs its independent queries concurrently, in
+worker threads with their own database connections, so it waits about as long
+as its slowest query rather than their sum: the home page reads the counters
+while it loads the visitor's session, and the lists count the rows while they
+fetch the page.
+
+Inside a transaction (e.g. in a TestCase) the queries run one after the other on
+the request's connection instead, as other connections would not see its
+uncommitted rows. The lists fall back to the sync views in cursor pagination and
+page cache modes, which have no independent queries to overlap.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import close_old_connections, connections
+from django.http import Http404
+from django.shortcuts import render
+
+from . import counters, metrics, views, visits
+from .models import Author, Movie
+
+
+# Worker threads for the queries. They (and their database connections) outlive
+# the requests, like the threads of a WSGI server.
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'CATALOG_ASYNC_QUERY_THREADS', 8),
+                              thread_name_prefix='catalog-query')
+
+
+def in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+def run_in_worker(func):
+    """Calls func in a worker thread, counting its queries in the request metrics."""
+    try:
+        with metrics.instrument_queries():
+            return func()
+    finally:
+        # Like at the end of a request, close the thread's connection if it is too old.
+        close_old_connections()
+
+
+async def run_concurrently(*funcs):
+    """Calls the functions concurrently in worker threads and returns their results in order."""
+    if await sync_to_async(in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    worker = sync_to_async(run_in_worker, thread_sensitive=False, executor=executor)
+    return await asyncio.gather(*[worker(func) for func in funcs])
+
+
+async def index(request):
+    """Async view function for home page of site (see views.index)."""
+    counts, num_visits = await run_concurrently(counters.read, partial(visits.count_visit, request))
+    context = {
+        'num_movies': counts[counters.NUM_MOVIES],
+        'num_instances': counts[counters.NUM_INSTANCES],
+        'num_instances_available': counts[counters.NUM_INSTANCES_AVAILABLE],
+        'num_authors': counts[counters.NUM_AUTHORS],
+        'num_visits': num_visits,
+    }
+    return await sync_to_async(render)(request, 'index.html', context=context)
+
+
+async def paginate(request, queryset, page_size):
+    """Returns the requested page of queryset like ListView, counting the rows while fetching the page."""
+    paginator = Paginator(queryset, page_size)
+    page_number = request.GET.get('page') or 1
+    if page_number == 'last':
+        # The page depends on the count here, so the queries cannot overlap.
+        paginator.count = await sync_to_async(queryset.count)()
+        number = paginator.num_pages
+        bottom = (number - 1) * page_size
+        rows = await sync_to_async(list)(queryset[bottom:bottom + page_size])
+    else:
+        try:
+            number = int(page_number)
+        except ValueError:
+            raise Http404("Page is not 'last', nor can it be converted to an int.")
+        if number < 1:
+            raise Http404('Invalid page ({0}): That page number is less than 1'.format(number))
+        bottom = (number - 1) * page_size
+        paginator.count, rows = await run_concurrently(
+            queryset.count, lambda: list(queryset[bottom:bottom + page_size]))
+    try:
+        number = paginator.validate_number(number)
+    except InvalidPage as e:
+        raise Http404('Invalid page ({0}): {1}'.format(number, e))
+    return Page(rows, number, paginator)
+
+
+def list_view(sync_view, queryset, page_size, template_name, context_object_name):
+    """Returns an async view rendering a paginated list, like the given sync ListView."""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request):
+        if (getattr(settings, 'CATALOG_CURSOR_PAGINATION', False)
+                or getattr(settings, 'CATALOG_PAGE_CACHE', False)):
+            return await sync_view(request)
+        page = await paginate(request, queryset, page_size)
+        context = {
+            'paginator': page.paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': page.object_list,
+            context_object_name: page.object_list,
+        }
+        return await sync_to_async(render)(request, template_name, context)
+    return view
+
+
+movie_list = list_view(views.MovieListView.as_view(), Movie.objects.select_related('author'),
+                       views.MovieListView.paginate_by, 'catalog/movie_list.html', 'movie_list')
+author_list = list_view(views.AuthorListView.as_view(), Author.objects.all(),
+                        views.AuthorListView.paginate_by, 'catalog/author_list.html', 'author_list')
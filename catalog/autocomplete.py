@@ -0,0 +1,66 @@
+"""Indexed prefix search for the autocomplete widgets.
+
+prefix_search() matches rows where one of the given fields starts with the
+search term, case-insensitively, as a range on UPPER(field): the expression
+indexes on those fields (see the Author and Movie models and migration 0009,
+which also indexes UPPER(auth_user.username)) answer it without scanning the
+table, in the order of the first field.
+
+The autocomplete endpoints (under /catalog/autocomplete/) serve the widgets of
+the public movie forms; the admin's own autocomplete endpoint uses the same
+search through PrefixAutocompleteMixin (see catalog.admin). Both return pages
+of {"results": [{"id": ..., "text": ...}], "pagination": {"more": ...}}, as
+the select2 widget expects, for ?term= and ?page=.
+"""
+from django.db.models import Q, Value
+from django.db.models.functions import Upper
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Author, Genre, Language
+
+
+PAGE_SIZE = 20
+MAX_PAGE = 50
+
+# Sorts after every character, so UPPER(field) < UPPER(term + PREFIX_END) bounds the prefix.
+PREFIX_END = '\U0010ffff'
+
+
+def prefix_search(queryset, fields, term):
+    """Returns the rows of queryset where one of fields starts with term (ignoring case), ordered by the first field."""
+    keys = {'prefix_key_{0}'.format(number): Upper(field) for number, field in enumerate(fields)}
+    queryset = queryset.alias(**keys).order_by(*keys, 'pk')
+    term = term.strip()
+    if not term:
+        return queryset
+    condition = Q()
+    for key in keys:
+        # The term is upper-cased by the database too, so both sides fold case the same way.
+        condition |= Q(**{key + '__gte': Upper(Value(term)), key + '__lt': Upper(Value(term + PREFIX_END))})
+    return queryset.filter(condition)
+
+
+# The querysets and the fields searched by each autocomplete endpoint.
+SOURCES = {
+    'authors': (Author.objects.only('first_name', 'last_name'), ('last_name', 'first_name')),
+    'genres': (Genre.objects.all(), ('name',)),
+    'languages': (Language.objects.all(), ('name',)),
+}
+
+
+@require_GET
+def autocomplete(request, source_name):
+    """View function returning a page of the rows matching ?term= as JSON."""
+    queryset, fields = SOURCES[source_name]
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), MAX_PAGE)
+    except ValueError:
+        page = 1
+    start = (page - 1) * PAGE_SIZE
+    # Fetch one extra row to find out whether there is a further page, instead of counting.
+    rows = list(prefix_search(queryset, fields, request.GET.get('term', ''))[start:start + PAGE_SIZE + 1])
+    return JsonResponse({
+        'results': [{'id': str(row.pk), 'text': str(row)} for row in rows[:PAGE_SIZE]],
+        'pagination': {'more': len(rows) > PAGE_SIZE and page < MAX_PAGE},
+    })
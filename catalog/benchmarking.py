@@ -0,0 +1,37 @@
+"""Helpers shared by the bench_* management commands."""
+import math
+import time
+from contextlib import contextmanager
+
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """Runs the body against throwaway test databases, the same way manage.py test does."""
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def time_calls(func, repeat):
+    """Calls func repeat times and returns the duration of each call in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings, percent):
+    """Returns the given percentile (0-100) of a list of timings, by nearest rank."""
+    ordered = sorted(timings)
+    rank = max(int(math.ceil(percent / 100 * len(ordered))), 1)
+    return ordered[rank - 1]
@@ -0,0 +1,129 @@
+"""Version-keyed caching of rendered catalog pages for anonymous visitors.
+
+Each model the catalog pages are built from has a version number stored in
+the cache. The signal handlers in catalog.signals bump a model's version once
+a transaction that saved or deleted one of its rows commits. A page is cached
+under a key made of its URL and the versions of the models it depends on, so
+any change makes the old entries unreachable and pages are never served
+stale; the timeout only exists to let unreachable entries expire.
+
+Enable with CATALOG_PAGE_CACHE = True. Works with any cache backend; note that
+with the local-memory backend every process has its own cache (and versions),
+so use a shared backend (file based, memcached, ...) with several workers.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+VERSION_KEY = 'catalog:version:{0}'
+PAGE_KEY = 'catalog:page-headers:{0}:{1}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_PAGE_CACHE_ALIAS', 'default')]
+
+
+def version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def new_version():
+    # Versions start from the clock, so a counter that was evicted from the cache
+    # is never reset to a value an old page was cached under.
+    return time.time_ns()
+
+
+def bump_version(*models):
+    """Marks every page built from the given models as out of date."""
+    cache = get_cache()
+    for model in models:
+        try:
+            cache.incr(version_key(model))
+        except ValueError:
+            cache.set(version_key(model), new_version(), timeout=None)
+
+
+def get_versions(models):
+    """Returns the current version of each model, with a single cache read."""
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+class CacheStats:
+    """In-process hit and miss counts of the page cache, per view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def record(self, view_name, hit):
+        with self._lock:
+            counts = self.hits if hit else self.misses
+            counts[view_name] = counts.get(view_name, 0) + 1
+
+    def hit_ratio(self, view_name=None):
+        """Returns the share of requests served from the cache (for one view, or overall)."""
+        hits = self.hits.get(view_name, 0) if view_name else sum(self.hits.values())
+        misses = self.misses.get(view_name, 0) if view_name else sum(self.misses.values())
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.hits, self.misses = {}, {}
+
+
+stats = CacheStats()
+
+
+class VersionedPageCacheMixin:
+    """View mixin caching the rendered page of anonymous GET requests.
+
+    cache_models lists the models the page is built from.
+    """
+    cache_models = ()
+
+    def use_page_cache(self, request):
+        return (getattr(settings, 'CATALOG_PAGE_CACHE', False) and request.method == 'GET'
+                and not request.user.is_authenticated)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.use_page_cache(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        view_name = type(self).__name__
+        versions = '.'.join(str(version) for version in get_versions(self.cache_models))
+        key = PAGE_KEY.format(hashlib.md5(request.get_full_path().encode()).hexdigest(), versions)
+        cached = cache.get(key)
+        if cached is not None:
+            stats.record(view_name, hit=True)
+            content, headers = cached
+            response = HttpResponse(content)
+            # The page's own headers (Content-Type, Vary, Cache-Control, ...), as on a miss.
+            for header, value in headers:
+                response[header] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        stats.record(view_name, hit=False)
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == 200:
+            # Cookies are left out: they belong to the visitor who got the page rendered.
+            cache.set(key, (response.content, list(response.items())),
+                      timeout=getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 24 * 60 * 60))
+        response['X-Cache'] = 'MISS'
+        return response
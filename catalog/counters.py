@@ -0,0 +1,105 @@
+"""Materialized catalog counters shown on the home page.
+
+Counting rows in MovieInstance on every hit to the index page is expensive on a
+large catalog, so the counts are stored in CatalogCounter rows instead. They are
+adjusted by the signal handlers in catalog.signals whenever a Movie, Author or
+MovieInstance is created, deleted or changes status, and can be recomputed from
+scratch with reconcile() (see the reconcile_counters management command).
+
+Each Movie likewise stores its total_copies and available_copies, adjusted with
+adjust_copies() and recomputed with repair_copies() (see the
+reconcile_copy_counts management command).
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Author, CatalogCounter, Movie, MovieInstance
+
+
+NUM_MOVIES = 'num_movies'
+NUM_INSTANCES = 'num_instances'
+NUM_INSTANCES_AVAILABLE = 'num_instances_available'
+NUM_AUTHORS = 'num_authors'
+
+# The query each counter materializes, used to seed and reconcile the counters.
+COUNTER_QUERIES = {
+    NUM_MOVIES: lambda: Movie.objects.count(),
+    NUM_INSTANCES: lambda: MovieInstance.objects.count(),
+    NUM_INSTANCES_AVAILABLE: lambda: MovieInstance.objects.filter(status__exact='a').count(),
+    NUM_AUTHORS: lambda: Author.objects.count(),
+}
+
+# The counter holding the number of rows of each model (for unfiltered admin changelists).
+MODEL_COUNTERS = {
+    Movie: NUM_MOVIES,
+    MovieInstance: NUM_INSTANCES,
+    Author: NUM_AUTHORS,
+}
+
+
+def adjust(name, delta):
+    """Atomically add delta to the named counter."""
+    if not delta:
+        return
+    updated = CatalogCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        # The row is missing (e.g. the table was flushed), so rebuild it from the source query.
+        CatalogCounter.objects.update_or_create(name=name, defaults={'value': COUNTER_QUERIES[name]()})
+
+
+def read():
+    """Returns a dict with the value of every counter, using a single query."""
+    values = dict(CatalogCounter.objects.values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in COUNTER_QUERIES}
+
+
+def reconcile():
+    """Recomputes every counter from its source query.
+
+    Returns a dict mapping the name of each counter that had drifted to a
+    (stored, actual) tuple.
+    """
+    stored = dict(CatalogCounter.objects.values_list('name', 'value'))
+    drift = {}
+    for name, query in COUNTER_QUERIES.items():
+        actual = query()
+        if stored.get(name) != actual:
+            CatalogCounter.objects.update_or_create(name=name, defaults={'value': actual})
+            drift[name] = (stored.get(name), actual)
+    return drift
+
+
+def adjust_copies(movies, total=0, available=0):
+    """Atomically add to the copy counts of the movies in the queryset."""
+    if total or available:
+        movies.update(total_copies=F('total_copies') + total, available_copies=F('available_copies') + available)
+
+
+def copy_count(**filters):
+    """Subquery counting a movie's copies (those matching filters, if given).
+
+    The available copies of a movie (status__exact='a') are counted from the
+    partial index on available copies, per movie.
+    """
+    copies = MovieInstance.objects.filter(movie=OuterRef('pk'), **filters).order_by().values('movie')
+    return Coalesce(Subquery(copies.annotate(count=Count('pk')).values('count')), 0)
+
+
+def repair_copies(chunk_size=1000):
+    """Recomputes the copy counts of every movie, chunk_size movies per transaction.
+
+    Returns the number of movies whose counts had drifted.
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = list(Movie.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return repaired
+        with transaction.atomic():
+            chunk = Movie.objects.filter(id__gt=last_id, id__lte=ids[-1]).annotate(
+                actual_total=copy_count(), actual_available=copy_count(status__exact='a'))
+            drifted = chunk.exclude(total_copies=F('actual_total'), available_copies=F('actual_available'))
+            repaired += drifted.update(total_copies=copy_count(), available_copies=copy_count(status__exact='a'))
+        last_id = ids[-1]
@@ -0,0 +1,144 @@
+"""Streaming export of the catalog (movies with their genres and copies).
+
+The movies, genre links and copies are each read with a single query walked
+through a server-side cursor (QuerySet.iterator()), all ordered by movie id,
+and merged as they stream in. Output is produced incrementally as CSV (one row
+per copy) or NDJSON (one object per movie), optionally gzip compressed, so
+memory use does not depend on the size of the catalog.
+"""
+import csv
+import io
+import json
+import zlib
+
+from .models import Movie, MovieInstance
+
+
+CSV_COLUMNS = ['movie_id', 'isbn', 'title', 'author', 'language', 'genres',
+               'copy_id', 'imprint', 'status', 'due_back', 'borrower']
+
+# Output is buffered into chunks of about this many characters before being yielded.
+CHUNK_SIZE = 64 * 1024
+
+
+def grouped_by_movie(rows):
+    """Yields (movie_id, rows) for rows ordered by their 'movie_id' key."""
+    group, group_movie_id = [], None
+    for row in rows:
+        if row['movie_id'] != group_movie_id and group:
+            yield group_movie_id, group
+            group = []
+        group_movie_id = row['movie_id']
+        group.append(row)
+    if group:
+        yield group_movie_id, group
+
+
+def take_group(groups, current, movie_id):
+    """Returns (rows of movie_id, new current group), advancing the grouped iterator as needed."""
+    while current is not None and current[0] < movie_id:
+        current = next(groups, None)
+    if current is not None and current[0] == movie_id:
+        return current[1], next(groups, None)
+    return [], current
+
+
+def movie_records(chunk_size=2000):
+    """Yields a dict per movie (in id order) with its genre names and a list of copy dicts."""
+    movies = (Movie.objects.order_by('id')
+              .values('id', 'isbn', 'title', 'author__first_name', 'author__last_name', 'language__name')
+              .iterator(chunk_size=chunk_size))
+    genres = grouped_by_movie(
+        Movie.genre.through.objects.order_by('movie_id', 'genre__name')
+        .values('movie_id', 'genre__name').iterator(chunk_size=chunk_size))
+    copies = grouped_by_movie(
+        MovieInstance.objects.filter(movie__isnull=False).order_by('movie_id', 'id')
+        .values('movie_id', 'id', 'imprint', 'status', 'due_back', 'borrower__username')
+        .iterator(chunk_size=chunk_size))
+
+    current_genres, current_copies = next(genres, None), next(copies, None)
+    for movie in movies:
+        movie_genres, current_genres = take_group(genres, current_genres, movie['id'])
+        movie_copies, current_copies = take_group(copies, current_copies, movie['id'])
+        author = ''
+        if movie['author__last_name'] is not None:
+            author = '{0}, {1}'.format(movie['author__last_name'], movie['author__first_name'])
+        yield {
+            'id': movie['id'],
+            'isbn': movie['isbn'],
+            'title': movie['title'],
+            'author': author,
+            'language': movie['language__name'] or '',
+            'genres': [row['genre__name'] for row in movie_genres],
+            'copies': [{
+                'id': str(row['id']),
+                'imprint': row['imprint'],
+                'status': row['status'],
+                'due_back': row['due_back'].isoformat() if row['due_back'] else None,
+                'borrower': row['borrower__username'],
+            } for row in movie_copies],
+        }
+
+
+def csv_rows(records):
+    """Yields the CSV rows (lists) for the movie records, one row per copy."""
+    yield CSV_COLUMNS
+    for record in records:
+        movie_columns = [record['id'], record['isbn'], record['title'], record['author'], record['language'],
+                         '|'.join(record['genres'])]
+        for copy in record['copies'] or [None]:
+            if copy is None:
+                yield movie_columns + [''] * 5
+            else:
+                yield movie_columns + [copy['id'], copy['imprint'], copy['status'], copy['due_back'] or '',
+                                       copy['borrower'] or '']
+
+
+def export_csv(records):
+    """Yields the records as CSV text, in chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in csv_rows(records):
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(records):
+    """Yields the records as newline delimited JSON, in chunks."""
+    lines, size = [], 0
+    for record in records:
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+
+FORMATS = {
+    'csv': export_csv,
+    'ndjson': export_ndjson,
+}
+
+
+def gzipped(chunks):
+    """Compresses a stream of text chunks into a stream of gzip bytes."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(export_format='csv', gzip=False, chunk_size=2000):
+    """Returns an iterator of bytes with the whole catalog in the given format."""
+    chunks = FORMATS[export_format](movie_records(chunk_size=chunk_size))
+    if gzip:
+        return gzipped(chunks)
+    return (chunk.encode() for chunk in chunks)
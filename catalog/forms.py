@@ -1,6 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 import datetime  # for checking renewal date range.
+import uuid
 
 from django import forms
 
@@ -23,3 +24,78 @@ class RenewMovieForm(forms.Form):
 
         # Remember to always return the cleaned data.
         return data
+
+
+class UUIDListField(forms.Field):
+    """Form field for a list of UUIDs (e.g. from checkboxes), validated without loading any rows."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [uuid.UUID(str(item)) for item in value]
+        except ValueError:
+            raise ValidationError(_('Invalid selection'), code='invalid')
+
+
+class BulkRenewMovieForm(RenewMovieForm):
+    """Form for a librarian to renew the selected loans, or all of them, at once."""
+    instance = UUIDListField(required=False)
+    renew_all = forms.BooleanField(required=False, help_text="Renew every movie on loan, not just the selected ones.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('renew_all') and not cleaned_data.get('instance'):
+            raise ValidationError(_('Select the movies to renew'))
+        return cleaned_data
+
+
+class MovieSearchForm(forms.Form):
+    """Form for searching movies by title, summary, author or genre."""
+    q = forms.CharField(label='Search', max_length=200)
+    page = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+
+
+from django.contrib import admin
+from django.contrib.admin import widgets
+from django.urls import reverse
+
+from .models import Movie
+
+
+class CatalogAutocompleteMixin:
+    """The admin's select2 autocomplete widget, fed by one of the catalog's public endpoints
+    (see catalog.autocomplete) instead of the admin's, which is for staff only.
+
+    Like the admin widget, it renders just the selected options, so the form does
+    not load the whole related table.
+    """
+
+    def __init__(self, field, url_name, attrs=None):
+        super().__init__(field, admin.site, attrs)
+        self.catalog_url_name = url_name
+
+    def get_url(self):
+        return reverse(self.catalog_url_name)
+
+
+class AutocompleteSelect(CatalogAutocompleteMixin, widgets.AutocompleteSelect):
+    pass
+
+
+class AutocompleteSelectMultiple(CatalogAutocompleteMixin, widgets.AutocompleteSelectMultiple):
+    pass
+
+
+class MovieForm(forms.ModelForm):
+    """Form for a librarian to create or update a movie, autocompleting the author, language and genres."""
+
+    class Meta:
+        model = Movie
+        fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+        widgets = {
+            'author': AutocompleteSelect(Movie._meta.get_field('author'), 'autocomplete-authors'),
+            'genre': AutocompleteSelectMultiple(Movie._meta.get_field('genre'), 'autocomplete-genres'),
+            'language': AutocompleteSelect(Movie._meta.get_field('language'), 'autocomplete-languages'),
+        }
@@ -0,0 +1,142 @@
+"""Loan operations on movie copies: checkout, return, reserve and renewal.
+
+Every change is a conditional UPDATE on the copy's status rather than a save()
+of the whole row, so concurrent operations on the same copy cannot both succeed
+or overwrite each other's columns. Like other bulk changes these bypass the
+model signals, so they keep the counters (including the movies' copy counts), the page cache and the copies'
+updated_at current themselves.
+
+The bulk operations (return_copies, send_to_maintenance, make_available and
+renew) change a whole queryset of copies with one UPDATE, and record a
+StatusChange for every copy changed.
+"""
+import datetime
+import itertools
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import caching, counters
+from .models import Movie, MovieInstance, StatusChange
+
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+SUCCESS = 'success'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+
+
+class LoanResult(namedtuple('LoanResult', ['outcome', 'copy_id', 'status'])):
+    """Outcome of a loan operation, with the copy's status afterwards (None if there is no such copy)."""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.outcome == SUCCESS
+
+
+def transition(copy_id, from_status, to_status, changes=None, **conditions):
+    """Moves a copy from from_status to to_status, applying changes to its other fields.
+
+    The status check and the write are a single UPDATE ... WHERE status = from_status,
+    so of several concurrent transitions from the same status exactly one succeeds;
+    the others get a CONFLICT result with the status the copy has now.
+    """
+    with transaction.atomic():
+        updated = MovieInstance.objects.filter(pk=copy_id, status__exact=from_status, **conditions).update(
+            status=to_status, updated_at=timezone.now(), **(changes or {}))
+        if updated:
+            delta = int(to_status == 'a') - int(from_status == 'a')
+            counters.adjust(counters.NUM_INSTANCES_AVAILABLE, delta)
+            counters.adjust_copies(Movie.objects.filter(movieinstance__pk=copy_id), available=delta)
+            transaction.on_commit(lambda: caching.bump_version(MovieInstance))
+            return LoanResult(SUCCESS, copy_id, to_status)
+    status = MovieInstance.objects.filter(pk=copy_id).values_list('status', flat=True).first()
+    return LoanResult(NOT_FOUND if status is None else CONFLICT, copy_id, status)
+
+
+def checkout(copy_id, borrower, due_back=None):
+    """Lends an available copy, or one reserved for the same borrower."""
+    changes = {'borrower': borrower, 'due_back': due_back or datetime.date.today() + LOAN_PERIOD}
+    result = transition(copy_id, 'a', 'o', changes)
+    if result.status == 'r':
+        result = transition(copy_id, 'r', 'o', changes, borrower=borrower)
+    return result
+
+
+def return_copy(copy_id):
+    """Makes a copy on loan available again."""
+    return transition(copy_id, 'o', 'a', {'borrower': None, 'due_back': None})
+
+
+def reserve(copy_id, borrower):
+    """Reserves an available copy for the borrower."""
+    return transition(copy_id, 'a', 'r', {'borrower': borrower, 'due_back': None})
+
+
+def adjust_available(copies, delta):
+    """Adds delta to the available copy counts for every copy in the queryset (of its movie, and in total)."""
+    num_copies = copies.count()
+    if not num_copies:
+        return
+    counters.adjust(counters.NUM_INSTANCES_AVAILABLE, delta * num_copies)
+    per_movie = (copies.filter(movie=OuterRef('pk')).order_by().values('movie')
+                 .annotate(count=Count('pk')).values('count'))
+    Movie.objects.filter(pk__in=copies.values('movie')).update(
+        available_copies=F('available_copies') + delta * Subquery(per_movie))
+
+
+def bulk_transition(copies, from_statuses, to_status, action, changes=None, user=None, batch_size=1000):
+    """Moves the copies of the queryset with one of from_statuses to to_status with a single UPDATE.
+
+    Only the ids and statuses of the copies are read, in batches of batch_size, to
+    record a StatusChange for each; the copies themselves are never loaded, so
+    copies may be as large as a whole filtered changelist. Returns the number of
+    copies moved.
+    """
+    changes = changes or {}
+    moved = MovieInstance.objects.filter(pk__in=copies.values('pk'), status__in=from_statuses)
+    # The transaction takes the write lock up front (see catalog.sqlite3), or the rows' locks where
+    # supported, so the copies recorded are the copies updated.
+    with transaction.atomic():
+        now = timezone.now()
+        rows = moved.select_for_update().order_by().values_list('pk', 'status').iterator(chunk_size=batch_size)
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+            StatusChange.objects.bulk_create([
+                StatusChange(movie_instance_id=pk, action=action, from_status=status, to_status=to_status,
+                             due_back=changes.get('due_back'), changed_by=user, changed_at=now)
+                for pk, status in batch])
+        if to_status == 'a':
+            adjust_available(moved.exclude(status__exact='a'), 1)
+        elif 'a' in from_statuses:
+            adjust_available(moved.filter(status__exact='a'), -1)
+        updated = moved.update(status=to_status, updated_at=now, **changes)
+        if updated:
+            transaction.on_commit(lambda: caching.bump_version(MovieInstance))
+    return updated
+
+
+def return_copies(copies, user=None):
+    """Makes the copies on loan in the queryset available again; returns how many were returned."""
+    return bulk_transition(copies, ['o'], 'a', 'return', {'borrower': None, 'due_back': None}, user)
+
+
+def send_to_maintenance(copies, user=None):
+    """Withdraws the available and reserved copies in the queryset for maintenance; copies on loan are left alone."""
+    return bulk_transition(copies, ['a', 'r'], 'd', 'maintenance', {'borrower': None, 'due_back': None}, user)
+
+
+def make_available(copies, user=None):
+    """Makes the copies in maintenance or reserved in the queryset available; copies on loan are left alone."""
+    return bulk_transition(copies, ['d', 'r'], 'a', 'available', {'borrower': None, 'due_back': None}, user)
+
+
+def renew(loans, due_back, user=None):
+    """Sets the due date of the copies on loan in the loans queryset with a single UPDATE.
+
+    Returns the number of loans renewed; copies that are not on loan are left alone.
+    """
+    return bulk_transition(loans, ['o'], 'o', 'renew', {'due_back': due_back}, user)
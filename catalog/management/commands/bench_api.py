@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from catalog import counters
+from catalog.benchmarking import isolated_database, percentile, time_calls
+from catalog.models import Author, Genre, Language, Movie, MovieInstance
+
+
+class Command(BaseCommand):
+    help = ('Compares the latency and response size of the JSON API with the HTML '
+            'movie and author lists (uses a test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=20000)
+        parser.add_argument('--authors', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.seed(options['movies'], options['authors'])
+            client = Client()
+            comparisons = [
+                ('movies', reverse('movies')),
+                ('movies', reverse('api-movies') + '?limit=10'),
+                ('movies', reverse('api-movies') + '?limit=10&fields=id,title'),
+                ('authors', reverse('authors')),
+                ('authors', reverse('api-authors') + '?limit=10'),
+                ('availability', reverse('api-availability') + '?limit=10'),
+            ]
+            for name, url in comparisons:
+                size = len(client.get(url).content)
+                timings = time_calls(lambda: client.get(url), options['repeat'])
+                self.stdout.write('{0:>12} {1:<45}: p50 {2:8.2f} ms  p95 {3:8.2f} ms  {4:>7} bytes'.format(
+                    name, url, percentile(timings, 50), percentile(timings, 95), size))
+
+    def seed(self, num_movies, num_authors):
+        authors = Author.objects.bulk_create(
+            [Author(first_name='First {0}'.format(i), last_name='Last {0:06d}'.format(i)) for i in range(num_authors)],
+            batch_size=1000)
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name='Genre {0}'.format(i)) for i in range(10)]
+        movies = Movie.objects.bulk_create(
+            [Movie(title='Movie {0:07d}'.format(i), summary='Summary', isbn=str(i), author=authors[i % num_authors],
+                   language=language)
+             for i in range(num_movies)],
+            batch_size=1000)
+        Movie.genre.through.objects.bulk_create(
+            [Movie.genre.through(movie_id=movie.pk, genre_id=genres[movie.pk % 10].pk) for movie in movies],
+            batch_size=1000)
+        MovieInstance.objects.bulk_create(
+            [MovieInstance(movie=movie, imprint='Imprint', status='a' if copy else 'o')
+             for movie in movies for copy in range(2)],
+            batch_size=1000)
+        counters.repair_copies()
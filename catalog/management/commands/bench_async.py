@@ -0,0 +1,104 @@
+import importlib
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches, reverse
+
+from catalog.benchmarking import isolated_database, percentile, time_calls
+
+
+URL_NAMES = ('index', 'movies', 'authors')
+
+
+def load_urls():
+    """Re-imports the URLconfs, which pick the sync or async views from CATALOG_ASYNC_VIEWS."""
+    import catalog.urls
+    import locallibrary.urls
+    importlib.reload(catalog.urls)
+    importlib.reload(locallibrary.urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = """Compares the home page and the lists served by the sync views through the WSGI
+    handler with the async views (catalog/async_views.py) through the ASGI handler.
+
+    Uses a test database seeded with seed_catalog. --query-delay adds a sleep to every
+    query, like the network round trip to a database server: against the local SQLite
+    database the queries are too fast for running them concurrently to pay off.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--query-delay', type=float, default=0.0,
+                            help='Milliseconds to add to every query (default 0).')
+
+    def handle(self, *args, **options):
+        delay = options['query_delay'] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            # Connections are reopened on the same wrapper, which keeps its execute wrappers.
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        with isolated_database():
+            call_command('seed_catalog', movies=options['movies'], copies=5, authors=options['movies'] // 5,
+                         users=100, verbosity=0)
+            if delay:
+                connection_created.connect(add_delay)
+                for connection in connections.all():
+                    add_delay(None, connection)
+            try:
+                results = {}
+                with override_settings(CATALOG_ASYNC_VIEWS=False):
+                    load_urls()
+                    client = Client()
+                    for url_name in URL_NAMES:
+                        url = reverse(url_name)
+                        self.check_status(url, client.get(url))
+                        results['wsgi', url_name] = time_calls(lambda: client.get(url), options['repeat'])
+                with override_settings(CATALOG_ASYNC_VIEWS=True):
+                    load_urls()
+                    # All requests in one event loop, as in an ASGI server.
+                    results.update(async_to_sync(self.time_asgi)(options['repeat']))
+            finally:
+                connection_created.disconnect(add_delay)
+                load_urls()
+
+        self.report(results)
+
+    async def time_asgi(self, repeat):
+        client = AsyncClient()
+        results = {}
+        for url_name in URL_NAMES:
+            url = reverse(url_name)
+            self.check_status(url, await client.get(url))
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            results['asgi', url_name] = timings
+        return results
+
+    def check_status(self, url, response):
+        if response.status_code != 200:
+            raise CommandError('{0} returned {1}'.format(url, response.status_code))
+
+    def report(self, results):
+        for url_name in URL_NAMES:
+            wsgi, asgi = results['wsgi', url_name], results['asgi', url_name]
+            self.stdout.write('{0:<8} wsgi p50 {1:7.2f} ms  p95 {2:7.2f} ms   asgi p50 {3:7.2f} ms  p95 {4:7.2f} ms'
+                              '  ({5:+.0%})'.format(url_name, percentile(wsgi, 50), percentile(wsgi, 95),
+                                                   percentile(asgi, 50), percentile(asgi, 95),
+                                                   percentile(asgi, 50) / percentile(wsgi, 50) - 1))
@@ -0,0 +1,139 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+
+from catalog.benchmarking import isolated_database, percentile, time_calls
+from catalog.models import Author, Movie, MovieInstance
+from catalog.urls import urlpatterns
+
+
+# Query strings for the views that need one to do their work.
+QUERY_STRINGS = {
+    'movie-search': '?q=night',
+    'api-movies': '?limit=50',
+    'autocomplete-authors': '?term=ka',
+}
+
+
+class Command(BaseCommand):
+    help = """Benchmarks every view in catalog/urls.py against a seeded test database.
+
+    The database is filled with seed_catalog (so runs with the same options see the
+    same data) and every URL is requested by a logged in superuser. The p50 and p95
+    latency and the number of queries of each view are printed and, with --output,
+    written to a JSON file. --compare reads such a file from an earlier run and
+    fails if a view got slower than --threshold (and --min-ms) or runs more queries.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=5000)
+        parser.add_argument('--copies', type=int, default=5)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare with.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative increase of the p50 latency (default 0.2, i.e. 20%%).')
+        parser.add_argument('--min-ms', type=float, default=1.0,
+                            help='Ignore p50 increases smaller than this many milliseconds (timing noise).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                baseline = json.load(stream)
+
+        with isolated_database():
+            call_command('seed_catalog', movies=options['movies'], copies=options['copies'],
+                         authors=options['authors'], users=options['users'], seed=options['seed'],
+                         verbosity=0)
+            results = self.run(options['repeat'])
+
+        run = {'options': {name: options[name] for name in ('movies', 'copies', 'authors', 'users', 'seed', 'repeat')},
+               'views': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(run, stream, indent=2, sort_keys=True)
+        if baseline is not None:
+            self.compare(baseline, run, options['threshold'], options['min_ms'])
+
+    def run(self, repeat):
+        User.objects.create_superuser(username='benchmark', password='benchmark')
+        client = Client()
+        client.login(username='benchmark', password='benchmark')
+        samples = {
+            'movie': Movie.objects.order_by('-total_copies', 'id').first(),
+            'author': Author.objects.order_by('id').first(),
+            'copy': MovieInstance.objects.filter(status__exact='o').order_by('id').first(),
+        }
+
+        results = {}
+        for pattern in urlpatterns:
+            try:
+                url = self.url_for(pattern.name, samples)
+            except NoReverseMatch:
+                self.stderr.write('{0}: skipped, no sample arguments for this URL'.format(pattern.name))
+                continue
+
+            def get():
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                return response
+
+            with CaptureQueriesContext(connection) as context:
+                status_code = get().status_code
+            # Count now: the next request clears the connection's query log.
+            num_queries = len(context.captured_queries)
+            timings = time_calls(get, repeat)
+            results[pattern.name] = {
+                'url': url,
+                'status': status_code,
+                'queries': num_queries,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+            }
+            self.stdout.write('{0:<24} {1:>3} {2:>4} queries  p50 {3:8.2f} ms  p95 {4:8.2f} ms'.format(
+                pattern.name, status_code, num_queries, results[pattern.name]['p50_ms'], results[pattern.name]['p95_ms']))
+        return results
+
+    def url_for(self, url_name, samples):
+        kwargs = {}
+        if url_name.startswith('movie-') and url_name not in ('movie-create', 'movie-search'):
+            kwargs = {'pk': samples['movie'].pk}
+        elif url_name.startswith('author-') and url_name != 'author-create':
+            kwargs = {'pk': samples['author'].pk}
+        elif url_name == 'renew-movie-librarian':
+            kwargs = {'pk': samples['copy'].pk}
+        return reverse(url_name, kwargs=kwargs) + QUERY_STRINGS.get(url_name, '')
+
+    def compare(self, baseline, run, threshold, min_ms):
+        regressions = []
+        for url_name, result in sorted(run['views'].items()):
+            before = baseline['views'].get(url_name)
+            if before is None:
+                continue
+            change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0
+            flags = []
+            if change > threshold and result['p50_ms'] - before['p50_ms'] > min_ms:
+                flags.append('slower')
+            if result['queries'] > before['queries']:
+                flags.append('more queries')
+            self.stdout.write('{0:<24} p50 {1:8.2f} -> {2:8.2f} ms ({3:+6.1%})  queries {4} -> {5}  {6}'.format(
+                url_name, before['p50_ms'], result['p50_ms'], change, before['queries'], result['queries'],
+                'REGRESSION: ' + ', '.join(flags) if flags else ''))
+            if flags:
+                regressions.append(url_name)
+        if baseline.get('options') != run['options']:
+            self.stderr.write('The runs used different options; the comparison may not be meaningful.')
+        if regressions:
+            raise CommandError('{0} views regressed: {1}'.format(len(regressions), ', '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog.benchmarking import isolated_database, percentile, time_calls
+from catalog.models import Author, Movie
+
+
+class Command(BaseCommand):
+    help = ('Measures the overhead of the request metrics middleware (catalog.metrics) by '
+            'timing catalog pages with CATALOG_METRICS off and on (uses a test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            author = Author.objects.create(first_name='First', last_name='Last')
+            Movie.objects.bulk_create([Movie(title='Movie {0}'.format(i), summary='Summary', isbn=str(i),
+                                             author=author) for i in range(100)])
+            for url in (reverse('movies'), reverse('api-genres')):
+                clients = {}
+                for enabled in (False, True):
+                    # Clients load the middleware (or skip it) on their first request.
+                    with override_settings(CATALOG_METRICS=enabled):
+                        clients[enabled] = Client()
+                        clients[enabled].get(url)
+                # Alternate short rounds, so drift in the machine's speed affects both alike.
+                timings = {False: [], True: []}
+                for _ in range(options['rounds']):
+                    for enabled, client in clients.items():
+                        timings[enabled] += time_calls(lambda: client.get(url), options['repeat'] // options['rounds'])
+                for enabled in (False, True):
+                    self.stdout.write('{0:<22} metrics {1:<3}: p50 {2:7.3f} ms  p95 {3:7.3f} ms'.format(
+                        url, 'on' if enabled else 'off',
+                        percentile(timings[enabled], 50), percentile(timings[enabled], 95)))
+                overhead = percentile(timings[True], 50) - percentile(timings[False], 50)
+                self.stdout.write('{0:<22} overhead  : {1:+.3f} ms per request at p50'.format(url, overhead))
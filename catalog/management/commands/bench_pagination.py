@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog.benchmarking import isolated_database, percentile, time_calls
+from catalog.models import Author, Movie
+from catalog.pagination import NEXT, encode_cursor
+from catalog.views import AuthorListView, MovieListView
+
+
+class Command(BaseCommand):
+    help = ('Compares page 1 and last page latency of the movie and author lists with '
+            'page number (OFFSET) and cursor pagination (uses a test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=50000)
+        parser.add_argument('--authors', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.seed(options['movies'], options['authors'])
+            self.client = Client()
+            for url_name, view, count in (('movies', MovieListView, options['movies']),
+                                          ('authors', AuthorListView, options['authors'])):
+                self.compare(url_name, view, count, options['repeat'])
+
+    def seed(self, num_movies, num_authors):
+        authors = Author.objects.bulk_create(
+            [Author(first_name='First {0}'.format(i), last_name='Last {0:06d}'.format(i)) for i in range(num_authors)],
+            batch_size=1000)
+        Movie.objects.bulk_create(
+            [Movie(title='Movie {0:07d}'.format(i), summary='Summary', isbn=str(i), author=authors[i % num_authors])
+             for i in range(num_movies)],
+            batch_size=1000)
+
+    def compare(self, url_name, view, count, repeat):
+        url = reverse(url_name)
+        last_page = max((count - 1) // view.paginate_by + 1, 1)
+        # The cursor that leads to the same rows as the last numbered page.
+        last_seen = view.model.objects.order_by(*view.cursor_ordering)[(last_page - 1) * view.paginate_by - 1]
+        cursor = encode_cursor(NEXT, [getattr(last_seen, name) for name in view.cursor_ordering])
+
+        results = [
+            ('offset', 'page 1', False, url),
+            ('offset', 'page {0}'.format(last_page), False, '{0}?page={1}'.format(url, last_page)),
+            ('cursor', 'page 1', True, url),
+            ('cursor', 'page {0}'.format(last_page), True, '{0}?cursor={1}'.format(url, cursor)),
+        ]
+        for mode, page, cursor_pagination, page_url in results:
+            with override_settings(CATALOG_CURSOR_PAGINATION=cursor_pagination):
+                timings = time_calls(lambda: self.client.get(page_url), repeat)
+            self.stdout.write('{0:>8} {1:>7} {2:>12}: p50 {3:8.2f} ms  p95 {4:8.2f} ms'.format(
+                url_name, mode, page, percentile(timings, 50), percentile(timings, 95)))
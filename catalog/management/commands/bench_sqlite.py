@@ -0,0 +1,88 @@
+import datetime
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from catalog.models import Movie, MovieInstance
+
+
+PROFILES = {
+    'stock': 'django.db.backends.sqlite3',
+    'tuned': 'catalog.sqlite3',
+}
+
+
+def use_database(engine, name):
+    """Points the default database alias at the given SQLite engine and file."""
+    connections.close_all()
+    connections.settings['default'] = dict(connections.settings['default'], ENGINE=engine, NAME=name)
+    del connections['default']
+
+
+def worker(copy_ids, seconds, seed, results):
+    """Renews random loans and saves sessions until the time is up; reports writes and lock errors."""
+    rng = random.Random(seed)
+    writes = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if rng.random() < 0.5:
+                # A loan renewal that reads the copy and then writes it, like the renewal view.
+                with transaction.atomic():
+                    copy = MovieInstance.objects.get(pk=rng.choice(copy_ids))
+                    MovieInstance.objects.filter(pk=copy.pk).update(
+                        due_back=datetime.date.today() + datetime.timedelta(days=rng.randint(1, 28)))
+            else:
+                session = SessionStore()
+                session['num_visits'] = rng.randint(1, 100)
+                session.save()
+            writes += 1
+        except OperationalError:
+            errors += 1
+    connections.close_all()
+    results.put((writes, errors))
+
+
+class Command(BaseCommand):
+    help = ('Compares write throughput and "database is locked" errors of the stock SQLite '
+            'backend and the tuned catalog.sqlite3 backend, with several processes writing '
+            'loans and sessions to the same database file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--copies', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for profile, engine in PROFILES.items():
+                use_database(engine, os.path.join(directory, '{0}.sqlite3'.format(profile)))
+                call_command('migrate', verbosity=0)
+                movie = Movie.objects.create(title='Movie', summary='Summary', isbn='1')
+                MovieInstance.objects.bulk_create(
+                    [MovieInstance(movie=movie, imprint='Imprint', status='o') for _ in range(options['copies'])])
+                copy_ids = list(MovieInstance.objects.values_list('id', flat=True))
+                # The forked workers must open their own connections.
+                connections.close_all()
+
+                results = context.Queue()
+                processes = [context.Process(target=worker, args=(copy_ids, options['seconds'], seed, results))
+                             for seed in range(options['processes'])]
+                for process in processes:
+                    process.start()
+                counts = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+
+                writes = sum(count[0] for count in counts)
+                errors = sum(count[1] for count in counts)
+                self.stdout.write('{0:>6}: {1:8.0f} writes/s, {2} lock errors ({3:.2%} of attempts)'.format(
+                    profile, writes / options['seconds'], errors, errors / (writes + errors) if writes + errors else 0))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import visits
+from catalog.benchmarking import isolated_database
+
+
+def is_session_write(sql):
+    return sql.startswith(('INSERT', 'UPDATE')) and 'django_session' in sql
+
+
+class Command(BaseCommand):
+    help = ('Compares the number of session writes needed to count home page visits '
+            'with the session and buffered visit counting modes (uses a test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--visitors', type=int, default=10)
+        parser.add_argument('--flush-every', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            for mode in ('session', 'buffered'):
+                with override_settings(CATALOG_VISIT_COUNTING=mode,
+                                       CATALOG_VISIT_FLUSH_EVERY=options['flush_every']):
+                    writes = self.count_writes(options['requests'], options['visitors'])
+                self.stdout.write('{0:>8}: {1} session writes per {2} requests'.format(
+                    mode, writes, options['requests']))
+
+    def count_writes(self, num_requests, num_visitors):
+        clients = [Client() for _ in range(num_visitors)]
+        url = reverse('index')
+        with CaptureQueriesContext(connection) as context:
+            for i in range(num_requests):
+                clients[i % num_visitors].get(url)
+            # Write out whatever is still buffered, so both modes end with the same stored counts.
+            visits.buffer.flush()
+        return sum(1 for query in context.captured_queries if is_session_write(query['sql']))
@@ -0,0 +1,32 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.export import FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Exports all movies with their genres, copies and loan state, streaming the output.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--output', default='-', help='Output file, or - for standard output.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of rows fetched from the database cursor at a time.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in export_catalog(options['format'], gzip=options['gzip'], chunk_size=options['chunk_size']):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS('Wrote {0} bytes in {1:.1f}s.'.format(
+                written, time.monotonic() - start)))
@@ -0,0 +1,204 @@
+import csv
+import itertools
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from catalog import caching, counters, search
+from catalog.models import Author, Genre, Language, Movie, MovieInstance
+
+
+MOVIE_FIELDS = ['title', 'summary', 'author', 'language']
+
+
+class Command(BaseCommand):
+    help = """Imports movies from a CSV or JSON Lines file, in batches.
+
+    Each record describes one movie: isbn, title, summary, author_first_name,
+    author_last_name, language, genres (a list in JSON Lines, separated by "|" in
+    CSV), copies and imprint. Movies are matched on ISBN: existing movies are
+    updated and their genres replaced, new ones are created. copies is the number
+    of copies the movie should have; missing copies are created with the given
+    imprint and status. Only one batch of records is held in memory at a time.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (by default guessed from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--copy-status', default='a', choices=[code for code, _ in MovieInstance.LOAN_STATUS],
+                            help='Status of the copies created by the import.')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.copy_status = options['copy_status']
+        self.genres = {genre.name: genre.pk for genre in Genre.objects.all()}
+        self.languages = {language.name: language.pk for language in Language.objects.all()}
+        self.stats = dict.fromkeys(['rows', 'skipped', 'created', 'updated', 'authors', 'copies'], 0)
+
+        start = time.monotonic()
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            records = self.read_csv(stream) if input_format == 'csv' else self.read_jsonl(stream)
+            while True:
+                batch = list(itertools.islice(records, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch)
+                    # bulk_create() does not send the signals that invalidate cached pages.
+                    transaction.on_commit(lambda: caching.bump_version(Author, Genre, Language, Movie, MovieInstance))
+                if options['verbosity'] > 1:
+                    self.stdout.write('{0} rows imported'.format(self.stats['rows']))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {rows} rows ({created} movies created, {updated} updated, {authors} authors and '
+            '{copies} copies created, {skipped} skipped) '.format(**self.stats)
+            + 'in {0:.1f}s ({1:.0f} rows/s).'.format(elapsed, self.stats['rows'] / elapsed if elapsed else 0)))
+
+    def read_csv(self, stream):
+        for row in csv.DictReader(stream):
+            row['genres'] = [name for name in (row.get('genres') or '').split('|') if name]
+            yield row
+
+    def read_jsonl(self, stream):
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise CommandError('Line {0}: {1}'.format(line_number, error))
+            genres = record.get('genres') or []
+            record['genres'] = [name for name in genres.split('|') if name] if isinstance(genres, str) else genres
+            yield record
+
+    def import_batch(self, records):
+        """Imports a batch of records with set-based queries (no queries per row)."""
+        by_isbn = {}
+        for record in records:
+            self.stats['rows'] += 1
+            isbn = (record.get('isbn') or '').strip()
+            try:
+                record['copies'] = int(record.get('copies') or 0)
+            except (TypeError, ValueError):
+                record['copies'] = None
+            if not isbn or not record.get('title') or record['copies'] is None:
+                self.stats['skipped'] += 1
+                continue
+            by_isbn[isbn] = record  # A later record for the same ISBN wins.
+        if not by_isbn:
+            return
+
+        authors = self.resolve_authors(by_isbn.values())
+        self.resolve_names(Genre, self.genres, {name for record in by_isbn.values() for name in record['genres']})
+        self.resolve_names(Language, self.languages,
+                           {record['language'] for record in by_isbn.values() if record.get('language')})
+
+        existing = Movie.objects.in_bulk(list(by_isbn), field_name='isbn')
+        new_movies, updated_movies = [], []
+        for isbn, record in by_isbn.items():
+            author_key = (record.get('author_first_name') or '', record.get('author_last_name') or '')
+            values = {
+                'title': record['title'],
+                'summary': record.get('summary') or '',
+                'author_id': authors.get(author_key),
+                'language_id': self.languages.get(record.get('language')),
+            }
+            movie = existing.get(isbn)
+            if movie is None:
+                new_movies.append(Movie(isbn=isbn, **values))
+            elif any(getattr(movie, name) != value for name, value in values.items()):
+                # Only write the movies that actually changed (re-imports are mostly unchanged).
+                for name, value in values.items():
+                    setattr(movie, name, value)
+                updated_movies.append(movie)
+        Movie.objects.bulk_create(new_movies)
+        Movie.objects.bulk_update(updated_movies, MOVIE_FIELDS, batch_size=100)
+        self.stats['created'] += len(new_movies)
+        self.stats['updated'] += len(updated_movies)
+        counters.adjust(counters.NUM_MOVIES, len(new_movies))
+
+        # Not every backend returns primary keys from bulk_create(), so read them back.
+        movie_ids = dict(Movie.objects.filter(isbn__in=list(by_isbn)).values_list('isbn', 'id'))
+
+        changed_genres = self.replace_genres(by_isbn, movie_ids, existing_ids=[movie.pk for movie in existing.values()])
+
+        self.create_copies(by_isbn, movie_ids)
+        changed_ids = {movie_ids[movie.isbn] for movie in new_movies + updated_movies} | changed_genres
+        search.index_movies(list(changed_ids))
+        # bulk_update() does not apply auto_now, so touch the changed movies here.
+        Movie.objects.filter(id__in=changed_ids).update(updated_at=timezone.now())
+
+    def replace_genres(self, by_isbn, movie_ids, existing_ids):
+        """Sets the genres of each movie to those of its record, writing only the differences.
+
+        Returns the ids of the movies whose genres changed.
+        """
+        Genres = Movie.genre.through
+        wanted = {(movie_ids[isbn], self.genres[name]) for isbn, record in by_isbn.items() for name in record['genres']}
+        current = {(movie_id, genre_id): pk for pk, movie_id, genre_id in Genres.objects.filter(
+            movie_id__in=existing_ids).values_list('id', 'movie_id', 'genre_id')}
+        removed = set(current) - wanted
+        added = wanted - set(current)
+        Genres.objects.filter(id__in=[current[pair] for pair in removed]).delete()
+        Genres.objects.bulk_create([Genres(movie_id=movie_id, genre_id=genre_id) for movie_id, genre_id in added])
+        return {movie_id for movie_id, _ in removed | added}
+
+    def resolve_authors(self, records):
+        """Returns a dict mapping (first_name, last_name) to author id, creating missing authors."""
+        names = {(record.get('author_first_name') or '', record.get('author_last_name') or '')
+                 for record in records}
+        names.discard(('', ''))
+        if not names:
+            return {}
+        lookup = Author.objects.filter(last_name__in={last for _, last in names})
+        authors = {(first, last): pk for pk, first, last in lookup.values_list('id', 'first_name', 'last_name')
+                   if (first, last) in names}
+        missing = names - set(authors)
+        if missing:
+            Author.objects.bulk_create([Author(first_name=first, last_name=last) for first, last in missing])
+            self.stats['authors'] += len(missing)
+            counters.adjust(counters.NUM_AUTHORS, len(missing))
+            for pk, first, last in lookup.values_list('id', 'first_name', 'last_name'):
+                if (first, last) in names:
+                    authors[(first, last)] = pk
+        return authors
+
+    def resolve_names(self, model, cache, names):
+        """Adds the ids of the named genres or languages to cache, creating missing ones."""
+        missing = names - set(cache)
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing])
+            cache.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def create_copies(self, by_isbn, movie_ids):
+        """Creates the copies each movie is missing to reach its number of copies."""
+        wanted = {movie_ids[isbn]: (record['copies'], record.get('imprint') or '')
+                  for isbn, record in by_isbn.items()}
+        have = dict(Movie.objects.filter(pk__in=[pk for pk, (copies, _) in wanted.items() if copies])
+                    .values_list('pk', 'total_copies'))
+        missing = {movie_id: copies - have[movie_id] for movie_id, (copies, _) in wanted.items()
+                   if copies > have.get(movie_id, copies)}
+        new_copies = [MovieInstance(movie_id=movie_id, imprint=wanted[movie_id][1], status=self.copy_status)
+                      for movie_id, count in missing.items() for _ in range(count)]
+        MovieInstance.objects.bulk_create(new_copies)
+        self.stats['copies'] += len(new_copies)
+        available = self.copy_status == 'a'
+        counters.adjust(counters.NUM_INSTANCES, len(new_copies))
+        counters.adjust(counters.NUM_INSTANCES_AVAILABLE, len(new_copies) * available)
+        # One UPDATE per distinct number of new copies, usually a single one per batch.
+        by_count = {}
+        for movie_id, count in missing.items():
+            by_count.setdefault(count, []).append(movie_id)
+        for count, ids in by_count.items():
+            counters.adjust_copies(Movie.objects.filter(pk__in=ids), count, count * available)
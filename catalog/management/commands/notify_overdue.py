@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import notifications
+
+
+class Command(BaseCommand):
+    help = ('Emails every borrower one digest of their overdue loans, in batches over a single '
+            'connection of the configured email backend (see catalog/notifications.py). Loans '
+            'already notified for their current due date are skipped, so it is safe to rerun.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Digests sent per batch.')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Maximum messages per second (default 0, unlimited).')
+        parser.add_argument('--dry-run', action='store_true', help='Count the digests without sending them.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        result = notifications.notify_overdue(batch_size=options['batch_size'], rate=options['rate'] or None,
+                                              dry_run=options['dry_run'])
+        seconds = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            '{0} {1} overdue digests covering {2} loans in {3:.1f}s ({4:.0f} messages/s); '
+            '{5} borrowers have no email address.'.format(
+                'Would send' if options['dry_run'] else 'Sent', result.digests, result.loans, seconds,
+                result.digests / seconds if seconds else 0, result.skipped)))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.models import Movie
+from catalog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text movie search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of movies indexed per transaction.')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.create_index()
+        backend.clear()
+
+        start = time.monotonic()
+        indexed = 0
+        last_id = 0
+        while True:
+            ids = list(Movie.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                backend.index_movies(ids)
+            indexed += len(ids)
+            last_id = ids[-1]
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS('Indexed {0} movies in {1:.1f}s ({2:.0f} movies/s).'.format(
+            indexed, elapsed, indexed / elapsed if elapsed else 0)))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog import caching, counters
+from catalog.models import Movie
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the total and available copy counts stored on every movie, in '
+            'chunks of movies (one transaction each). Run it to repair any drift caused '
+            'by changes that bypass the model signals and catalog.loans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repaired = counters.repair_copies(options['chunk_size'])
+        if repaired:
+            caching.bump_version(Movie)
+        self.stdout.write(self.style.SUCCESS('Corrected the copy counts of {0} movies.'.format(repaired)))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import counters
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the materialized catalog counters shown on the home page. '
+            'Run it periodically (e.g. from cron) to repair any drift caused by bulk '
+            'updates that bypass model signals.')
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for name, (stored, actual) in drift.items():
+            self.stdout.write('{0}: {1} -> {2}'.format(name, stored, actual))
+        self.stdout.write(self.style.SUCCESS(
+            'Reconciled {0} counters ({1} corrected).'.format(len(counters.COUNTER_QUERIES), len(drift))))
@@ -0,0 +1,138 @@
+import datetime
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import caching, counters, search
+from catalog.models import Author, Genre, Language, Movie, MovieInstance
+
+
+GENRES = ['Action', 'Comedy', 'Documentary', 'Drama', 'Fantasy', 'Horror', 'Musical', 'Romance',
+          'Science Fiction', 'Thriller', 'Western', 'Animation']
+LANGUAGES = ['English', 'French', 'German', 'Japanese', 'Spanish', 'Italian', 'Korean', 'Hindi']
+WORDS = ['night', 'river', 'shadow', 'city', 'star', 'winter', 'garden', 'storm', 'last', 'silent', 'golden',
+         'broken', 'return', 'empire', 'island', 'dream', 'machine', 'forest', 'secret', 'summer', 'glass', 'iron',
+         'ocean', 'letter', 'train', 'mirror', 'fire', 'song', 'road', 'ghost']
+FIRST_NAMES = ['Agnes', 'Akira', 'Alfred', 'Billy', 'Chantal', 'Claire', 'Federico', 'Fritz', 'Hayao', 'Ingmar',
+               'Jane', 'Jean', 'Kathryn', 'Lina', 'Martin', 'Sofia', 'Satyajit', 'Stanley', 'Wong', 'Yasujiro']
+LAST_NAMES = ['Akerman', 'Bergman', 'Bigelow', 'Campion', 'Coppola', 'Denis', 'Fellini', 'Hitchcock', 'Kar-wai',
+              'Kubrick', 'Kurosawa', 'Lang', 'Miyazaki', 'Ozu', 'Ray', 'Renoir', 'Scorsese', 'Varda', 'Wertmuller',
+              'Wilder']
+
+# Share of copies in each status: available, on loan, reserved, maintenance.
+STATUS_WEIGHTS = [('a', 60), ('o', 30), ('r', 5), ('d', 5)]
+
+
+class Command(BaseCommand):
+    help = """Fills an empty catalog with a deterministic synthetic dataset, using bulk inserts.
+
+    The same options and --seed always produce the same movies, copies, users and
+    loans (due dates are relative to today). The defaults are production sized;
+    scale them down for quick runs. The counters, the copy counts, the search
+    index and the page cache versions are brought up to date at the end.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=100000)
+        parser.add_argument('--copies', type=int, default=10, help='Average number of copies per movie.')
+        parser.add_argument('--authors', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if Movie.objects.exists() or MovieInstance.objects.exists():
+            raise CommandError('The catalog is not empty; seed_catalog only fills an empty database.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = datetime.date.today()
+        start = time.monotonic()
+
+        with transaction.atomic():
+            genres = self.create_names(Genre, GENRES)
+            languages = self.create_names(Language, LANGUAGES)
+            authors = self.create_authors(options['authors'])
+            users = self.create_users(options['users'])
+        num_copies = 0
+        for first in range(0, options['movies'], self.batch_size):
+            count = min(self.batch_size, options['movies'] - first)
+            with transaction.atomic():
+                num_copies += self.create_movies(first, count, options['copies'], authors, genres, languages, users)
+            if options['verbosity'] > 1:
+                self.stdout.write('{0} movies created'.format(first + count))
+
+        counters.reconcile()
+        caching.bump_version(Author, Genre, Language, Movie, MovieInstance)
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded {0} movies, {1} copies, {2} authors and {3} users in {4:.1f}s.'.format(
+                options['movies'], num_copies, len(authors), len(users), time.monotonic() - start)))
+
+    def create_names(self, model, names):
+        model.objects.bulk_create([model(name=name) for name in names])
+        return list(model.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def create_authors(self, count):
+        authors = []
+        for number in range(count):
+            died = self.rng.random() < 0.3
+            born = datetime.date(1900, 1, 1) + datetime.timedelta(days=self.rng.randrange(365 * 90))
+            authors.append(Author(
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name='{0} {1}'.format(self.rng.choice(LAST_NAMES), number),
+                date_of_birth=born,
+                date_of_death=born + datetime.timedelta(days=self.rng.randrange(365 * 40, 365 * 90)) if died else None))
+        Author.objects.bulk_create(authors, batch_size=self.batch_size)
+        return list(Author.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count):
+        # Hashing a password per user would dominate the run; seeded users share one unusable password.
+        password = make_password(None)
+        User.objects.bulk_create([User(username='reader{0:06d}'.format(number), password=password)
+                                  for number in range(count)], batch_size=self.batch_size)
+        return list(User.objects.filter(username__startswith='reader').order_by('id').values_list('id', flat=True))
+
+    def create_movies(self, first, count, average_copies, authors, genres, languages, users):
+        """Creates count movies with their genres and copies; returns the number of copies."""
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        movies, copy_statuses = [], []
+        for number in range(first, first + count):
+            title = ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 4))).capitalize()
+            copies = self.rng.choices(statuses, weights, k=self.rng.randint(0, 2 * average_copies))
+            movies.append(Movie(
+                title=title,
+                summary='A {0} film about the {1} and the {2}.'.format(*self.rng.sample(WORDS, 3)),
+                isbn='{0:013d}'.format(number),
+                author_id=self.rng.choice(authors) if authors else None,
+                language_id=self.rng.choice(languages),
+                total_copies=len(copies),
+                available_copies=copies.count('a')))
+            copy_statuses.append(copies)
+        Movie.objects.bulk_create(movies)
+        # Not every backend returns primary keys from bulk_create(), so read them back.
+        ids = dict(Movie.objects.filter(isbn__in=[movie.isbn for movie in movies]).values_list('isbn', 'id'))
+        movie_ids = [ids[movie.isbn] for movie in movies]
+
+        Movie.genre.through.objects.bulk_create(
+            [Movie.genre.through(movie_id=movie_id, genre_id=genre_id)
+             for movie_id in movie_ids for genre_id in self.rng.sample(genres, self.rng.randint(1, 3))],
+            batch_size=self.batch_size)
+
+        copies = []
+        for movie_id, statuses_of_movie in zip(movie_ids, copy_statuses):
+            for status in statuses_of_movie:
+                on_loan = status == 'o' and users
+                copies.append(MovieInstance(
+                    id=uuid.UUID(int=self.rng.getrandbits(128), version=4),
+                    movie_id=movie_id,
+                    imprint='Imprint {0}'.format(self.rng.randrange(100)),
+                    status=status,
+                    borrower_id=self.rng.choice(users) if on_loan or status == 'r' and users else None,
+                    due_back=self.today + datetime.timedelta(days=self.rng.randint(-14, 28)) if on_loan else None))
+        MovieInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+        search.index_movies(movie_ids)
+        return len(copies)
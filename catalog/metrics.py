@@ -0,0 +1,207 @@
+"""Per-view request metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware records, for each resolved URL name, a histogram of request
+latencies and of database query counts, plus the total time spent in the
+database (measured with connection.execute_wrapper) and in template rendering
+(measured by the InstrumentedDjangoTemplates backend). The metrics view serves
+them, and the page cache hit and miss counts (catalog.caching), to staff.
+
+Enable with CATALOG_METRICS = True. The metrics are kept in memory, so every
+worker process reports its own; scrape each worker, or sum them upstream.
+"""
+import contextvars
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+from . import caching
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+UNRESOLVED = 'unresolved'
+
+# The metrics of the request being handled, for the template backend and for queries run
+# in worker threads (sync_to_async() copies the context into them).
+_current = contextvars.ContextVar('catalog_request_metrics', default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class ViewMetrics:
+    """Everything recorded about the requests to one view."""
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+class RequestMetrics:
+    """Query count, database time and template time of a single request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the duration of the request.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # Async views run queries in several threads at once.
+            with self._lock:
+                self.db_seconds += time.perf_counter() - start
+                self.queries += 1
+
+
+class MetricsRegistry:
+    """In-process metrics of every view, updated under a lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, seconds, request_metrics):
+        with self._lock:
+            metrics = self.views.get(view_name)
+            if metrics is None:
+                metrics = self.views[view_name] = ViewMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(request_metrics.queries)
+            metrics.db_seconds += request_metrics.db_seconds
+            metrics.template_seconds += request_metrics.template_seconds
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def render(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = []
+            write_histogram(lines, 'catalog_request_duration_seconds', 'Request latency by view.',
+                            [(name, metrics.latency) for name, metrics in views])
+            write_histogram(lines, 'catalog_db_queries', 'Database queries per request by view.',
+                            [(name, metrics.queries) for name, metrics in views])
+            write_counter(lines, 'catalog_db_duration_seconds_total', 'Time spent in database queries by view.',
+                          [(name, metrics.db_seconds) for name, metrics in views])
+            write_counter(lines, 'catalog_template_duration_seconds_total', 'Time spent rendering templates by view.',
+                          [(name, metrics.template_seconds) for name, metrics in views])
+        write_counter(lines, 'catalog_page_cache_hits_total', 'Page cache hits by view.',
+                      sorted(caching.stats.hits.items()))
+        write_counter(lines, 'catalog_page_cache_misses_total', 'Page cache misses by view.',
+                      sorted(caching.stats.misses.items()))
+        return '\n'.join(lines) + '\n'
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_histogram(lines, name, help_text, histograms):
+    lines += ['# HELP {0} {1}'.format(name, help_text), '# TYPE {0} histogram'.format(name)]
+    for view_name, histogram in histograms:
+        view = label(view_name)
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append('{0}_bucket{{view="{1}",le="{2}"}} {3}'.format(name, view, bound, count))
+        lines.append('{0}_bucket{{view="{1}",le="+Inf"}} {2}'.format(name, view, histogram.count))
+        lines.append('{0}_sum{{view="{1}"}} {2}'.format(name, view, histogram.sum))
+        lines.append('{0}_count{{view="{1}"}} {2}'.format(name, view, histogram.count))
+
+
+def write_counter(lines, name, help_text, values):
+    lines += ['# HELP {0} {1}'.format(name, help_text), '# TYPE {0} counter'.format(name)]
+    for view_name, value in values:
+        lines.append('{0}{{view="{1}"}} {2}'.format(name, label(view_name), value))
+
+
+registry = MetricsRegistry()
+
+
+def instrument_queries():
+    """Returns a context manager recording the current thread's queries in the current request's metrics."""
+    stack = ExitStack()
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(request_metrics))
+    return stack
+
+
+class MetricsMiddleware:
+    """Records the latency, queries and template time of every request (see the module docstring)."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CATALOG_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            with instrument_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        match = request.resolver_match
+        registry.record(match.view_name if match else UNRESOLVED, time.perf_counter() - start, request_metrics)
+        return response
+
+
+class InstrumentedTemplate:
+    """Wraps a template of the Django backend to time its rendering."""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        request_metrics = _current.get()
+        if request_metrics is None:
+            return self._wrapped.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            request_metrics.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with the render time recorded for MetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
@@ -0,0 +1,39 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Create the counter rows with the current catalog counts."""
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    Movie = apps.get_model('catalog', 'Movie')
+    MovieInstance = apps.get_model('catalog', 'MovieInstance')
+    Author = apps.get_model('catalog', 'Author')
+    db = schema_editor.connection.alias
+    counts = {
+        'num_movies': Movie.objects.using(db).count(),
+        'num_instances': MovieInstance.objects.using(db).count(),
+        'num_instances_available': MovieInstance.objects.using(db).filter(status__exact='a').count(),
+        'num_authors': Author.objects.using(db).count(),
+    }
+    CatalogCounter.objects.using(db).bulk_create(
+        [CatalogCounter(name=name, value=value) for name, value in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
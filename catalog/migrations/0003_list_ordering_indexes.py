@@ -0,0 +1,21 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_catalogcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='catalog_aut_last_na_b2b7ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'author', 'id'], name='catalog_mov_title_e0b84e_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# The DDL and document queries are frozen here as they were when the index was introduced, so that later
+# changes to catalog.search do not change what this migration does.
+AUTHOR_NAME_SQL = "(SELECT a.first_name || ' ' || a.last_name FROM catalog_author a WHERE a.id = m.author_id)"
+GENRE_NAMES_SQL = """(SELECT {aggregate} FROM catalog_movie_genre mg
+    JOIN catalog_genre g ON g.id = mg.genre_id WHERE mg.movie_id = m.id)"""
+
+SEARCH_INDEX_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_movie_search USING fts5("
+        "title, summary, author, genres, tokenize='unicode61 remove_diacritics 2')",
+        'INSERT INTO catalog_movie_search (rowid, title, summary, author, genres) '
+        "SELECT m.id, m.title, m.summary, COALESCE({0}, ''), COALESCE({1}, '') FROM catalog_movie m".format(
+            AUTHOR_NAME_SQL, GENRE_NAMES_SQL.format(aggregate="group_concat(g.name, ' ')")),
+    ],
+    'postgresql': [
+        'CREATE TABLE IF NOT EXISTS catalog_movie_search (movie_id bigint PRIMARY KEY, document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS catalog_movie_search_document_idx ON catalog_movie_search USING GIN (document)',
+        'INSERT INTO catalog_movie_search (movie_id, document) '
+        "SELECT m.id, setweight(to_tsvector('simple', m.title), 'A') "
+        "|| setweight(to_tsvector('simple', COALESCE({0}, '')), 'B') "
+        "|| setweight(to_tsvector('simple', COALESCE({1}, '')), 'B') "
+        "|| setweight(to_tsvector('simple', m.summary), 'C') "
+        'FROM catalog_movie m'.format(AUTHOR_NAME_SQL, GENRE_NAMES_SQL.format(aggregate="string_agg(g.name, ' ')")),
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index for the database backend and index the existing movies."""
+    for sql in SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SEARCH_INDEX_SQL:
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_movie_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movieinstance',
+            index=models.Index(fields=['borrower', 'status', 'due_back'], name='catalog_loan_borrower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movieinstance',
+            index=models.Index(condition=models.Q(('status', 'o')), fields=['due_back'], name='catalog_loan_on_loan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movieinstance',
+            index=models.Index(condition=models.Q(('status', 'a')), fields=['status'], name='catalog_loan_available_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.0.2 on 2026-10-17 20:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def seed_copy_counts(apps, schema_editor):
+    """Set the copy counts of every movie from its copies."""
+    Movie = apps.get_model('catalog', 'Movie')
+    MovieInstance = apps.get_model('catalog', 'MovieInstance')
+    db = schema_editor.connection.alias
+    copies = MovieInstance.objects.using(db).filter(movie=OuterRef('pk')).order_by().values('movie')
+
+    def count(**filters):
+        return Coalesce(Subquery(copies.annotate(count=Count('pk', filter=Q(**filters))).values('count')), 0)
+
+    Movie.objects.using(db).update(total_copies=count(), available_copies=count(status__exact='a'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='available_copies',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='total_copies',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_copy_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.2 on 2026-10-17 21:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def create_username_index(apps, schema_editor):
+    """Index the upper-cased usernames of the user model's table (AUTH_USER_MODEL may not be auth.User)."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.execute('CREATE INDEX catalog_user_username_upper_idx ON {0} ((UPPER({1})))'.format(
+        schema_editor.quote_name(User._meta.db_table),
+        schema_editor.quote_name(User._meta.get_field('username').column)))
+
+
+def drop_username_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX catalog_user_username_upper_idx')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0008_overdue_notice'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Upper('last_name'), name='catalog_author_last_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Upper('first_name'), name='catalog_author_first_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(django.db.models.functions.text.Upper('title'), name='catalog_movie_title_upper_idx'),
+        ),
+        # Borrower autocompletion in the admin searches the usernames (see catalog.autocomplete).
+        migrations.RunPython(create_username_index, drop_username_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.2 on 2026-10-17 21:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0009_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('return', 'Returned'), ('maintenance', 'Sent to maintenance'), ('available', 'Made available'), ('renew', 'Renewed')], max_length=20)),
+                ('from_status', models.CharField(choices=[('d', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('to_status', models.CharField(choices=[('d', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('movie_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.movieinstance')),
+            ],
+            options={
+                'ordering': ['-changed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.2 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_status_change'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movieinstance',
+            name='catalog_loan_available_idx',
+        ),
+        migrations.AddIndex(
+            model_name='movieinstance',
+            index=models.Index(condition=models.Q(('status', 'a')), fields=['movie'], name='catalog_loan_available_idx'),
+        ),
+    ]
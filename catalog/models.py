@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 # Create your models here.
 
@@ -42,9 +44,20 @@ class Movie(models.Model):
     # ManyToManyField used because a genre can contain many movies and a movie can cover many genres.
     # Genre class has already been defined so we can specify the object above.
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
-    
+    updated_at = models.DateTimeField(auto_now=True)
+    # Also touched when the movie's genres change or a copy is deleted (see catalog.signals).
+    total_copies = models.IntegerField(default=0, editable=False)
+    available_copies = models.IntegerField(default=0, editable=False)
+    # Copy counts maintained with the copies (see catalog.counters), so lists need not aggregate them.
+
     class Meta:
         ordering = ['title', 'author']
+        indexes = [
+            # Keyset pagination of the movie list (see catalog.pagination).
+            models.Index(fields=['title', 'author', 'id']),
+            # Prefix search of the autocomplete widgets (see catalog.autocomplete).
+            models.Index(Upper('title'), name='catalog_movie_title_upper_idx'),
+        ]
 
     def display_genre(self):
         """Creates a string for the Genre. This is required to display genre in Admin."""
@@ -94,10 +107,28 @@ class MovieInstance(models.Model):
         blank=True,
         default='d',
         help_text='movie availability')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['due_back']
         permissions = (("can_mark_returned", "Set movie as returned"),)
+        indexes = [
+            # Movies on loan to a user, by due date (LoanedMoviesByUserListView).
+            models.Index(fields=['borrower', 'status', 'due_back'], name='catalog_loan_borrower_idx'),
+            # All movies on loan, by due date (LoanedMoviesAllListView). Partial where supported.
+            models.Index(fields=['due_back'], name='catalog_loan_on_loan_idx', condition=models.Q(status='o')),
+            # Available copies, per movie (index page counts, the movies' available copy counts).
+            models.Index(fields=['movie'], name='catalog_loan_available_idx', condition=models.Q(status='a')),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Atomic so that the movie's copy counts, adjusted by the signal handlers, change with the row.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         """String for representing the Model object."""
@@ -110,9 +141,18 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Also touched when one of the author's movies is deleted or moved to another author.
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Keyset pagination of the author list (see catalog.pagination).
+            models.Index(fields=['last_name', 'first_name', 'id']),
+            # Prefix search of the autocomplete widgets (see catalog.autocomplete).
+            models.Index(Upper('last_name'), name='catalog_author_last_upper_idx'),
+            models.Index(Upper('first_name'), name='catalog_author_first_upper_idx'),
+        ]
 
     def get_absolute_url(self):
         """Returns the url to access a particular author instance."""
@@ -121,3 +161,63 @@ class Author(models.Model):
     def __str__(self):
         """String for representing the Model object."""
         return '{0}, {1}'.format(self.last_name, self.first_name)
+
+
+class CatalogCounter(models.Model):
+    """Model representing a materialized count of catalog rows (e.g. number of movies).
+
+    Rows are kept current by the signal handlers in catalog.signals and can be
+    recomputed with the reconcile_counters management command.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return '{0}: {1}'.format(self.name, self.value)
+
+
+class StatusChange(models.Model):
+    """Model recording a change of a copy's status or due date made by a bulk operation (see catalog.loans)."""
+    ACTIONS = (
+        ('return', 'Returned'),
+        ('maintenance', 'Sent to maintenance'),
+        ('available', 'Made available'),
+        ('renew', 'Renewed'),
+    )
+
+    movie_instance = models.ForeignKey(MovieInstance, on_delete=models.CASCADE)
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    from_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS)
+    to_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS)
+    due_back = models.DateField(null=True, blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-changed_at']
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return '{0}: {1} -> {2}'.format(self.movie_instance_id, self.from_status, self.to_status)
+
+
+class OverdueNotice(models.Model):
+    """Model recording that a borrower was sent an overdue notice for a loan (see catalog.notifications).
+
+    There is one row per copy and due date, so reruns do not notify again, while a
+    renewed loan that becomes overdue again is notified anew.
+    """
+    movie_instance = models.ForeignKey(MovieInstance, on_delete=models.CASCADE)
+    due_back = models.DateField()
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie_instance', 'due_back'], name='catalog_overdue_notice_unique'),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return '{0} (due {1})'.format(self.movie_instance_id, self.due_back)
@@ -0,0 +1,87 @@
+"""Overdue loan notices: one digest email per borrower (see the notify_overdue command).
+
+The overdue loans are selected with a single query on the on-loan index and
+grouped by borrower. The digests go out in batches over one connection of the
+configured email backend, optionally rate limited. After each batch an
+OverdueNotice is recorded for every loan it covered, so a rerun only notifies
+the loans that were not notified yet (a failure can resend at most one batch).
+"""
+import contextlib
+import datetime
+import itertools
+import time
+from collections import namedtuple
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+
+from .models import MovieInstance, OverdueNotice
+
+
+NotifyResult = namedtuple('NotifyResult', ['digests', 'loans', 'skipped'])
+
+
+def overdue_loans(today=None):
+    """Returns the overdue loans not notified yet, ordered by borrower."""
+    today = today or datetime.date.today()
+    notified = OverdueNotice.objects.filter(movie_instance=OuterRef('pk'), due_back=OuterRef('due_back'))
+    return (MovieInstance.objects.filter(status__exact='o', due_back__lt=today, borrower__isnull=False)
+            .filter(~Exists(notified))
+            .select_related('movie', 'borrower').order_by('borrower_id', 'due_back', 'id'))
+
+
+def group_by_borrower(loans):
+    """Yields a (borrower, loans) tuple per borrower, from loans ordered by borrower."""
+    for _, group in itertools.groupby(loans, key=lambda loan: loan.borrower_id):
+        group = list(group)
+        yield group[0].borrower, group
+
+
+def digest_message(borrower, loans, today):
+    context = {'borrower': borrower, 'loans': loans, 'today': today}
+    return EmailMessage(
+        subject=render_to_string('catalog/email/overdue_digest_subject.txt', context).strip(),
+        body=render_to_string('catalog/email/overdue_digest.txt', context),
+        to=[borrower.email])
+
+
+def notify_overdue(today=None, batch_size=100, rate=None, connection=None, dry_run=False):
+    """Sends a digest of their overdue loans to every borrower that has not been notified of them.
+
+    rate limits the sending to that many messages per second. Borrowers without an
+    email address are skipped (and considered again on the next run). With
+    dry_run nothing is sent or recorded.
+    """
+    today = today or datetime.date.today()
+    connection = connection or get_connection()
+    digests = num_loans = skipped = 0
+    start = time.monotonic()
+    borrowers = group_by_borrower(overdue_loans(today).iterator(chunk_size=2000))
+
+    # One connection (e.g. one SMTP session) for all the batches.
+    with contextlib.nullcontext() if dry_run else connection:
+        while True:
+            batch = list(itertools.islice(borrowers, batch_size))
+            if not batch:
+                break
+            messages, notices = [], []
+            for borrower, loans in batch:
+                if not borrower.email:
+                    skipped += 1
+                    continue
+                messages.append(digest_message(borrower, loans, today))
+                notices += [OverdueNotice(movie_instance_id=loan.pk, due_back=loan.due_back, borrower_id=borrower.pk)
+                            for loan in loans]
+            if not dry_run and messages:
+                connection.send_messages(messages)
+                OverdueNotice.objects.bulk_create(notices, ignore_conflicts=True)
+            digests += len(messages)
+            num_loans += len(notices)
+
+            if rate and not dry_run:
+                # Wait until the messages sent so far fit in the rate.
+                delay = digests / rate - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+    return NotifyResult(digests, num_loans, skipped)
@@ -0,0 +1,153 @@
+"""Keyset (cursor) pagination for the catalog list views.
+
+The default ListView pagination uses OFFSET queries plus a COUNT(*) per page,
+so deep pages get slower as the catalog grows. In cursor mode each page is
+instead selected with a condition on the ordering fields of the last row seen
+(e.g. ``title > 'X' OR (title = 'X' AND ...)``), which an index on those fields
+answers in the same time for every page. Pages are addressed by opaque
+next/previous tokens and there is no total count or page number.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, values):
+    """Returns an opaque token for the page after (or before) the row with the given ordering values."""
+    payload = json.dumps([direction, list(values)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, num_values):
+    """Returns the (direction, values) encoded in token, raising Http404 if it is not a valid cursor."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise Http404('Invalid cursor')
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or len(values) != num_values:
+        raise Http404('Invalid cursor')
+    return direction, values
+
+
+def keyset_filter(model, fields, values, after=True, nulls_largest=False):
+    """Returns a Q selecting the rows after (or before) values, in ascending order of fields.
+
+    nulls_largest tells whether the database sorts NULLs after (True) or before
+    all other values, as in the connection feature of the same name.
+    """
+    # Whether the NULLs of a field lie in the direction we are moving in.
+    nulls_ahead = after == nulls_largest
+    lookup = '__gt' if after else '__lt'
+    condition = Q()
+    equal = Q()
+    for name, value in zip(fields, values):
+        nullable = model._meta.get_field(name).null
+        if value is None:
+            step = Q(pk__in=[]) if nulls_ahead else Q(**{name + '__isnull': False})
+        else:
+            step = Q(**{name + lookup: value})
+            if nullable and nulls_ahead:
+                step |= Q(**{name + '__isnull': True})
+        condition |= equal & step
+        equal &= Q(**{name + '__isnull': True}) if value is None else Q(**{name: value})
+
+    if values and values[0] is not None:
+        # Redundant range on the leading field, so the database can seek in an
+        # index on the ordering fields instead of scanning it.
+        bound = Q(**{fields[0] + ('__gte' if after else '__lte'): values[0]})
+        if model._meta.get_field(fields[0]).null and nulls_ahead:
+            bound |= Q(**{fields[0] + '__isnull': True})
+        condition = bound & condition
+    return condition
+
+
+def keyset_ordering(fields, reverse=False):
+    """Returns the order_by() arguments matching keyset_filter()."""
+    return ['-' + name if reverse else name for name in fields]
+
+
+class CursorPage:
+    """A page of results selected with a keyset condition instead of an OFFSET.
+
+    The ordering must end with a unique field (e.g. the primary key) so that
+    every row has a distinct position.
+    """
+    is_cursor_page = True
+
+    def __init__(self, queryset, ordering, page_size, cursor=None):
+        if cursor:
+            direction, values = decode_cursor(cursor, len(ordering))
+            nulls_largest = connections[queryset.db].features.nulls_order_largest
+            try:
+                queryset = queryset.filter(keyset_filter(
+                    queryset.model, ordering, values, after=direction == NEXT, nulls_largest=nulls_largest))
+            except (TypeError, ValueError, ValidationError):
+                raise Http404('Invalid cursor')
+        else:
+            direction, values = NEXT, None
+
+        queryset = queryset.order_by(*keyset_ordering(ordering, reverse=direction == PREVIOUS))
+        # Fetch one extra row to find out whether there is a further page.
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == PREVIOUS:
+            rows.reverse()
+            self.has_next_page, self.has_previous_page = True, has_more
+        else:
+            self.has_next_page, self.has_previous_page = has_more, values is not None
+
+        self.object_list = rows
+        self.ordering = ordering
+        self.next_cursor = self.cursor_for(NEXT, rows[-1]) if rows and self.has_next_page else None
+        self.previous_cursor = self.cursor_for(PREVIOUS, rows[0]) if rows and self.has_previous_page else None
+
+    def cursor_for(self, direction, row):
+        # Rows are model instances, or dicts for values() querysets.
+        if isinstance(row, dict):
+            return encode_cursor(direction, [row[name] for name in self.ordering])
+        return encode_cursor(direction, [getattr(row, name) for name in self.ordering])
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginationMixin:
+    """ListView mixin adding an opt-in cursor pagination mode (CATALOG_CURSOR_PAGINATION setting).
+
+    cursor_ordering lists the fields the keyset is built on; it should follow
+    the model's Meta.ordering and end with the primary key as a tiebreaker.
+    """
+    cursor_ordering = ('id',)
+
+    def use_cursor_pagination(self):
+        return getattr(settings, 'CATALOG_CURSOR_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        page = CursorPage(queryset, self.cursor_ordering, page_size, self.request.GET.get('cursor'))
+        return (None, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,105 @@
+"""Database router sending catalog reads to read replicas.
+
+Reads of the models in CATALOG_REPLICA_APPS go to a random alias from
+CATALOG_REPLICAS; everything else, and every write, goes to the default
+(primary) database. Reads are pinned to the primary, so that a client sees its
+own writes despite replication lag:
+
+- for the rest of the request (or management command) once it wrote a catalog
+  model, and inside transaction.atomic() blocks on the primary;
+- for CATALOG_REPLICA_PIN_SECONDS after a request that wrote, through a cookie
+  set by ReplicaPinningMiddleware.
+
+The replicas are configured from CATALOG_REPLICA_URLS (see settings.py). To try
+it locally with SQLite, copy db.sqlite3 to replica.sqlite3 and start the server
+with CATALOG_REPLICA_URLS=sqlite:///replica.sqlite3 (there is no replication
+between the files, so the copy only shows which database served a read).
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'catalog_primary'
+
+
+class PinState:
+    """Whether reads are pinned to the primary, and whether the current request wrote."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# A mutable state object rather than a flag, so that changes made in threads
+# running sync_to_async() code (which get a copy of the context) are seen by the request.
+_state = contextvars.ContextVar('catalog_replica_pin_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'CATALOG_REPLICAS', [])
+
+
+def is_replicated(model):
+    return model._meta.app_label in getattr(settings, 'CATALOG_REPLICA_APPS', ['catalog'])
+
+
+def is_pinned():
+    state = _state.get()
+    return state is not None and state.pinned
+
+
+def pin_to_primary():
+    """Reads from the primary for the rest of the request (or command)."""
+    state = _state.get()
+    if state is None:
+        state = PinState()
+        _state.set(state)
+    state.pinned = state.wrote = True
+
+
+class ReplicaRouter:
+    """Routes reads of catalog models to the replicas, and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not is_replicated(model) or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if is_replicated(model) and get_replicas():
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas get their schema from the primary.
+        return False if db in get_replicas() else None
+
+
+class ReplicaPinningMiddleware:
+    """Pins a client's reads to the primary for a while after it wrote (see the module docstring)."""
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = PinState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS', 5),
+                                httponly=True, samesite='Lax')
+        return response
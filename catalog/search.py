@@ -0,0 +1,230 @@
+"""Full-text search over movies.
+
+Each movie has a search document built from its title, summary, author name
+and genre names. The documents are stored in a text index that depends on the
+database backend:
+
+ - SQLite: an FTS5 virtual table (rowid = movie id), ranked with bm25().
+ - PostgreSQL: a table of weighted tsvectors with a GIN index, ranked with ts_rank_cd().
+ - Any other backend: no index, matching falls back to icontains lookups.
+
+The index is created by migration 0004, kept in sync by the signal handlers in
+catalog.signals and can be rebuilt with the rebuild_search_index command.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection as default_connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+
+SearchResult = namedtuple('SearchResult', ['movie_id', 'rank', 'snippet'])
+
+# Markers wrapped around matched terms in snippets; replaced by <mark> tags after escaping.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+MAX_TERMS = 10
+
+
+def search_terms(query):
+    """Splits a user query into lowercase word terms (anything else is dropped)."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def format_snippet(text):
+    """Returns the snippet as safe HTML, with the matched terms in <mark> tags."""
+    html = escape(text).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Author name and genre names of a movie "m", shared by the document queries.
+AUTHOR_NAME_SQL = "(SELECT a.first_name || ' ' || a.last_name FROM catalog_author a WHERE a.id = m.author_id)"
+GENRE_NAMES_SQL = """(SELECT {aggregate} FROM catalog_movie_genre mg
+    JOIN catalog_genre g ON g.id = mg.genre_id WHERE mg.movie_id = m.id)"""
+
+
+class SqliteSearchBackend:
+    """Search index stored in an SQLite FTS5 virtual table."""
+    table = 'catalog_movie_search'
+    # Column weights for bm25(): title, summary, author, genres.
+    weights = (10.0, 1.0, 5.0, 5.0)
+    # SQLite limits the number of parameters per statement.
+    max_params = 500
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5("
+                "title, summary, author, genres, tokenize='unicode61 remove_diacritics 2')".format(self.table))
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {0}'.format(self.table))
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {0}'.format(self.table))
+
+    def delete_movies(self, movie_ids):
+        with self.connection.cursor() as cursor:
+            for ids in chunks(list(movie_ids), self.max_params):
+                cursor.execute('DELETE FROM {0} WHERE rowid IN ({1})'.format(
+                    self.table, ', '.join(['%s'] * len(ids))), ids)
+
+    def index_movies(self, movie_ids):
+        """(Re)builds the search documents of the given movies."""
+        movie_ids = list(movie_ids)
+        self.delete_movies(movie_ids)
+        with self.connection.cursor() as cursor:
+            for ids in chunks(movie_ids, self.max_params):
+                cursor.execute(
+                    'INSERT INTO {0} (rowid, title, summary, author, genres) '
+                    "SELECT m.id, m.title, m.summary, COALESCE({1}, ''), COALESCE({2}, '') "
+                    'FROM catalog_movie m WHERE m.id IN ({3})'.format(
+                        self.table, AUTHOR_NAME_SQL, GENRE_NAMES_SQL.format(aggregate="group_concat(g.name, ' ')"),
+                        ', '.join(['%s'] * len(ids))),
+                    ids)
+
+    def search(self, terms, limit, offset):
+        # Every term must match; the last one may be a prefix (search as you type).
+        match = ' '.join('"{0}"'.format(term) for term in terms) + '*'
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, bm25({0}, {1}) AS rank, snippet({0}, 1, %s, %s, %s, 16) FROM {0} '
+                'WHERE {0} MATCH %s ORDER BY rank LIMIT %s OFFSET %s'.format(
+                    self.table, ', '.join(str(weight) for weight in self.weights)),
+                [MATCH_START, MATCH_END, '…', match, limit, offset])
+            # bm25() is lower for better matches; negate it so that higher ranks are better everywhere.
+            return [SearchResult(movie_id, -rank, snippet) for movie_id, rank, snippet in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """Search index stored as weighted tsvectors in a table with a GIN index."""
+    table = 'catalog_movie_search'
+    headline_options = 'StartSel={0}, StopSel={1}, MaxWords=20, MinWords=8'.format(MATCH_START, MATCH_END)
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS {0} ('
+                           'movie_id bigint PRIMARY KEY, document tsvector NOT NULL)'.format(self.table))
+            cursor.execute('CREATE INDEX IF NOT EXISTS {0}_document_idx ON {0} USING GIN (document)'.format(
+                self.table))
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {0}'.format(self.table))
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('TRUNCATE {0}'.format(self.table))
+
+    def delete_movies(self, movie_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {0} WHERE movie_id = ANY(%s)'.format(self.table), [list(movie_ids)])
+
+    def index_movies(self, movie_ids):
+        """(Re)builds the search documents of the given movies."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {0} (movie_id, document) '
+                "SELECT m.id, setweight(to_tsvector('simple', m.title), 'A') "
+                "|| setweight(to_tsvector('simple', COALESCE({1}, '')), 'B') "
+                "|| setweight(to_tsvector('simple', COALESCE({2}, '')), 'B') "
+                "|| setweight(to_tsvector('simple', m.summary), 'C') "
+                'FROM catalog_movie m WHERE m.id = ANY(%s) '
+                'ON CONFLICT (movie_id) DO UPDATE SET document = EXCLUDED.document'.format(
+                    self.table, AUTHOR_NAME_SQL, GENRE_NAMES_SQL.format(aggregate="string_agg(g.name, ' ')")),
+                [list(movie_ids)])
+
+    def search(self, terms, limit, offset):
+        # Every term must match; the last one may be a prefix (search as you type).
+        tsquery = ' & '.join(terms) + ':*'
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT s.movie_id, ts_rank_cd(s.document, q) AS rank, ts_headline(%s, m.summary, q, %s) '
+                "FROM {0} s JOIN catalog_movie m ON m.id = s.movie_id, to_tsquery('simple', %s) q "
+                'WHERE s.document @@ q ORDER BY rank DESC, s.movie_id LIMIT %s OFFSET %s'.format(self.table),
+                ['simple', self.headline_options, tsquery, limit, offset])
+            return [SearchResult(*row) for row in cursor.fetchall()]
+
+
+class SimpleSearchBackend:
+    """Fallback for databases without a supported text index: unranked icontains matching."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def delete_movies(self, movie_ids):
+        pass
+
+    def index_movies(self, movie_ids):
+        pass
+
+    def search(self, terms, limit, offset):
+        from django.db.models import Q
+
+        from .models import Movie
+
+        movies = Movie.objects.using(self.connection.alias)
+        for term in terms:
+            movies = movies.filter(Q(title__icontains=term) | Q(summary__icontains=term)
+                                   | Q(author__first_name__icontains=term) | Q(author__last_name__icontains=term)
+                                   | Q(genre__name__icontains=term))
+        rows = movies.distinct().order_by('title', 'id').values_list('id', 'summary')[offset:offset + limit]
+        return [SearchResult(movie_id, 0, Truncator(summary).words(20)) for movie_id, summary in rows]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    """Returns the search backend for the connection's database vendor."""
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, SimpleSearchBackend)(connection)
+
+
+def index_movies(movie_ids):
+    """Updates the search documents of the given movies."""
+    if movie_ids:
+        get_backend().index_movies(movie_ids)
+
+
+def delete_movies(movie_ids):
+    """Removes the given movies from the search index."""
+    if movie_ids:
+        get_backend().delete_movies(movie_ids)
+
+
+def search(query, limit=20, offset=0):
+    """Returns a ranked list of SearchResult for the query (best match first)."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    return [result._replace(snippet=format_snippet(result.snippet))
+            for result in get_backend().search(terms, limit, offset)]
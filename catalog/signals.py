@@ -0,0 +1,176 @@
+"""Signal handlers for the catalog application (connected in CatalogConfig.ready)."""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, counters, search
+from .models import Author, Genre, Language, Movie, MovieInstance
+
+
+@receiver(post_save, sender=Movie)
+def count_created_movie(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(counters.NUM_MOVIES, 1)
+
+
+@receiver(post_delete, sender=Movie)
+def count_deleted_movie(sender, instance, **kwargs):
+    counters.adjust(counters.NUM_MOVIES, -1)
+
+
+@receiver(post_save, sender=Author)
+def count_created_author(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(counters.NUM_AUTHORS, 1)
+
+
+@receiver(post_delete, sender=Author)
+def count_deleted_author(sender, instance, **kwargs):
+    counters.adjust(counters.NUM_AUTHORS, -1)
+
+
+@receiver(post_init, sender=MovieInstance)
+def remember_loaded_status(sender, instance, **kwargs):
+    """Keep the status and movie the copy was loaded with, so saves can detect changes."""
+    # Read from __dict__ so deferred fields are not fetched here.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_movie_id = instance.__dict__.get('movie_id')
+
+
+@receiver(post_save, sender=MovieInstance)
+def count_saved_movieinstance(sender, instance, created, **kwargs):
+    available = int(instance.status == 'a')
+    was_available = int(instance._loaded_status == 'a')
+    if created:
+        counters.adjust(counters.NUM_INSTANCES, 1)
+        counters.adjust(counters.NUM_INSTANCES_AVAILABLE, available)
+        counters.adjust_copies(Movie.objects.filter(pk=instance.movie_id), 1, available)
+    elif instance._loaded_status is not None:
+        counters.adjust(counters.NUM_INSTANCES_AVAILABLE, available - was_available)
+        if instance._loaded_movie_id != instance.movie_id:
+            counters.adjust_copies(Movie.objects.filter(pk=instance._loaded_movie_id), -1, -was_available)
+            counters.adjust_copies(Movie.objects.filter(pk=instance.movie_id), 1, available)
+        else:
+            counters.adjust_copies(Movie.objects.filter(pk=instance.movie_id), available=available - was_available)
+    instance._loaded_status = instance.status
+    instance._loaded_movie_id = instance.movie_id
+
+
+@receiver(post_delete, sender=MovieInstance)
+def count_deleted_movieinstance(sender, instance, **kwargs):
+    was_available = int(instance._loaded_status == 'a')
+    counters.adjust(counters.NUM_INSTANCES, -1)
+    counters.adjust(counters.NUM_INSTANCES_AVAILABLE, -was_available)
+    counters.adjust_copies(Movie.objects.filter(pk=instance._loaded_movie_id), -1, -was_available)
+
+
+def touch_movies(movie_ids):
+    """Marks the movies as modified (for conditional GETs) when a change does not save them."""
+    if movie_ids:
+        Movie.objects.filter(id__in=movie_ids).update(updated_at=timezone.now())
+
+
+# Keep the full-text search index (catalog.search) in sync with the movies, and with
+# the author and genre names that are part of their search documents. Changes to
+# genre links and names also touch the movies' updated_at.
+
+@receiver(post_save, sender=Movie)
+def index_saved_movie(sender, instance, **kwargs):
+    search.index_movies([instance.pk])
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_deleted_movie(sender, instance, **kwargs):
+    search.delete_movies([instance.pk])
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        movie_ids = [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else []
+    elif action == 'pre_clear':
+        # Remember the genre's movies, they are gone from the relation after the clear.
+        instance._cleared_movie_ids = list(instance.movie_set.values_list('id', flat=True))
+        movie_ids = []
+    elif action == 'post_clear':
+        movie_ids = instance._cleared_movie_ids
+    else:
+        movie_ids = list(pk_set) if action in ('post_add', 'post_remove') else []
+    search.index_movies(movie_ids)
+    touch_movies(movie_ids)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_renamed_movies(sender, instance, created, **kwargs):
+    if not created:
+        movie_ids = list(instance.movie_set.values_list('id', flat=True))
+        search.index_movies(movie_ids)
+        if sender is Genre:
+            # A movie's freshness already includes its author's updated_at.
+            touch_movies(movie_ids)
+
+
+@receiver(post_save, sender=Language)
+def touch_language_movies(sender, instance, created, **kwargs):
+    if not created:
+        touch_movies(list(instance.movie_set.values_list('id', flat=True)))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def remember_deleted_movies(sender, instance, **kwargs):
+    instance._deleted_movie_ids = list(instance.movie_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def index_orphaned_movies(sender, instance, **kwargs):
+    movie_ids = getattr(instance, '_deleted_movie_ids', [])
+    search.index_movies(movie_ids)
+    touch_movies(movie_ids)
+
+
+# Keep the author's updated_at current when its list of movies changes without the
+# author being saved, and the movie's when one of its copies is deleted.
+
+@receiver(post_init, sender=Movie)
+def remember_loaded_author(sender, instance, **kwargs):
+    instance._loaded_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Movie)
+def touch_previous_author(sender, instance, created, **kwargs):
+    if not created and instance._loaded_author_id not in (None, instance.author_id):
+        Author.objects.filter(pk=instance._loaded_author_id).update(updated_at=timezone.now())
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Movie)
+def touch_author_of_deleted_movie(sender, instance, **kwargs):
+    if instance.author_id is not None:
+        Author.objects.filter(pk=instance.author_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=MovieInstance)
+def touch_movie_of_deleted_copy(sender, instance, **kwargs):
+    if instance.movie_id is not None:
+        touch_movies([instance.movie_id])
+
+
+# Invalidate the cached catalog pages (catalog.caching) once a change is committed.
+
+def invalidate_cached_pages(sender, **kwargs):
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    model = Movie if sender is Movie.genre.through else sender
+    transaction.on_commit(lambda: caching.bump_version(model))
+
+
+for model in (Movie, Author, Genre, Language, MovieInstance):
+    post_save.connect(invalidate_cached_pages, sender=model)
+    post_delete.connect(invalidate_cached_pages, sender=model)
+m2m_changed.connect(invalidate_cached_pages, sender=Movie.genre.through)
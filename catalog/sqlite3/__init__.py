@@ -0,0 +1,16 @@
+"""SQLite database backend tuned for several worker processes writing to one file.
+
+Use it with ENGINE = 'catalog.sqlite3'. It is the stock Django backend plus:
+
+- the pragmas in CATALOG_SQLITE_PRAGMAS, applied to every new connection from a
+  connection_created receiver. The defaults turn on write-ahead logging (readers
+  no longer block the writer or each other), relax fsyncs to the end of each WAL
+  checkpoint (synchronous=NORMAL is still safe from corruption in WAL mode), map
+  the file into memory, enlarge the page cache and wait for locks instead of
+  failing at once.
+- transactions that start with BEGIN IMMEDIATE, which takes the write lock up
+  front. With a plain (deferred) BEGIN a transaction that reads and then writes
+  has to upgrade its lock, and SQLite fails that with "database is locked"
+  instead of waiting when another connection is writing. The price is that
+  read-only atomic() blocks also queue for the write lock.
+"""
@@ -0,0 +1,78 @@
+"""Query budget assertions for the catalog views.
+
+Every URL name in catalog/urls.py must have an entry in QUERY_BUDGETS; the
+budget is the maximum number of queries a GET of that page may issue for a
+logged in librarian on the staff (so it includes the session, authentication
+and permission queries).
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+QUERY_BUDGETS = {
+    # Session, user and permission loads, counters read and the session save (savepoint and write).
+    'index': 8,
+    'movies': 6,
+    'movie-detail': 8,
+    'movie-search': 6,
+    'authors': 6,
+    'author-detail': 7,
+    'my-borrowed': 6,
+    'all-borrowed': 6,
+    'renew-movie-librarian': 5,
+    'renew-movies-librarian': 4,
+    'author-create': 4,
+    'author-update': 5,
+    'author-delete': 5,
+    'movie-create': 7,
+    'movie-update': 9,
+    'movie-delete': 5,
+    'catalog-export': 5,
+    'catalog-metrics': 2,
+    # The API does not touch the session: the page query, plus the genres for movies.
+    'api-movies': 2,
+    'api-authors': 1,
+    'api-genres': 1,
+    'api-availability': 1,
+    # One page of the prefix search, no count.
+    'autocomplete-authors': 1,
+    'autocomplete-genres': 1,
+    'autocomplete-languages': 1,
+}
+
+# The same for the admin changelist of every catalog model (registered in admin.site),
+# for a superuser: session, user, the count (the counters read for the catalog tables,
+# plus the full count for the others), the rows and any prefetch. No queries per row.
+ADMIN_CHANGELIST_BUDGETS = {
+    'admin:catalog_author_changelist': 4,
+    'admin:catalog_movie_changelist': 5,
+    'admin:catalog_movieinstance_changelist': 4,
+    'admin:catalog_genre_changelist': 5,
+    'admin:catalog_language_changelist': 5,
+    'admin:catalog_statuschange_changelist': 4,
+}
+
+
+class QueryBudgetMixin:
+    """TestCase mixin adding assertions on the number of queries issued by a view."""
+    query_budgets = QUERY_BUDGETS
+
+    def get_with_query_count(self, url):
+        """GETs the url with the test client and returns (response, captured queries)."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming:
+                # Streaming views run their queries while the content is consumed.
+                b''.join(response.streaming_content)
+        return response, context.captured_queries
+
+    def assertWithinQueryBudget(self, url_name, url):
+        """Asserts a GET of url stays within the budget of url_name and returns the number of queries."""
+        response, queries = self.get_with_query_count(url)
+        self.assertEqual(response.status_code, 200, url)
+        budget = self.query_budgets[url_name]
+        self.assertLessEqual(
+            len(queries), budget,
+            '{0} ({1}) issued {2} queries, budget is {3}:\n{4}'.format(
+                url_name, url, len(queries), budget, '\n'.join(query['sql'] for query in queries)))
+        return len(queries)
@@ -0,0 +1,174 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Genre, Language, Movie, MovieInstance
+
+
+def form_data(form, data):
+    """Adds the values shown by form to the POST data."""
+    for bound_field in form:
+        value = bound_field.value()
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            data[bound_field.html_name] = [str(item) for item in value]
+        else:
+            data[bound_field.html_name] = str(value)
+
+
+def change_form_data(response):
+    """Returns the POST data submitting the admin change form of response unchanged."""
+    data = {}
+    form_data(response.context['adminform'].form, data)
+    for inline_admin_formset in response.context['inline_admin_formsets']:
+        formset = inline_admin_formset.formset
+        form_data(formset.management_form, data)
+        # Leave out the blank extra forms.
+        data[formset.management_form['TOTAL_FORMS'].html_name] = str(formset.initial_form_count())
+        for form in formset.initial_forms:
+            form_data(form, data)
+    return data
+
+
+class PaginatedInlineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG',
+                                         author=cls.author, language=Language.objects.create(name='English'))
+        cls.movie.genre.set([Genre.objects.create(name='Fantasy')])
+        statuses = ['a'] * 30 + ['o'] * 10 + ['d'] * 5
+        for number, status in enumerate(statuses):
+            MovieInstance.objects.create(movie=cls.movie, imprint='Imprint {0}'.format(number), status=status,
+                                         due_back=datetime.date.today() + datetime.timedelta(days=number))
+        User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD')
+
+    def setUp(self):
+        self.client.login(username='admin', password='2HJ1vRV0Z&3iD')
+        self.url = reverse('admin:catalog_movie_change', args=[self.movie.pk])
+
+    def inline_formset(self, response):
+        return response.context['inline_admin_formsets'][0].formset
+
+    def test_inline_shows_a_page_of_copies(self):
+        response = self.client.get(self.url)
+        formset = self.inline_formset(response)
+        self.assertEqual(formset.initial_form_count(), 20)
+        self.assertEqual(formset.page.paginator.count, 45)
+        self.assertContains(response, 'Page 1 of 3')
+        self.assertContains(response, '?movieinstance_page=2')
+
+    def test_last_page(self):
+        response = self.client.get(self.url, {'movieinstance_page': 3})
+        formset = self.inline_formset(response)
+        self.assertEqual(formset.initial_form_count(), 5)
+        self.assertEqual([form.instance.imprint for form in formset.initial_forms],
+                         ['Imprint {0}'.format(number) for number in range(40, 45)])
+
+    def test_invalid_page_shows_first_page(self):
+        response = self.client.get(self.url, {'movieinstance_page': 'x'})
+        self.assertEqual(self.inline_formset(response).page.number, 1)
+
+    def test_edit_copy_on_second_page(self):
+        response = self.client.get(self.url, {'movieinstance_page': 2})
+        data = change_form_data(response)
+        data['movieinstance_set-0-imprint'] = 'New imprint'
+        response = self.client.post(self.url + '?movieinstance_page=2', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(MovieInstance.objects.get(imprint='New imprint').due_back,
+                         datetime.date.today() + datetime.timedelta(days=20))
+        self.assertEqual(MovieInstance.objects.count(), 45)
+
+    def test_edit_after_earlier_row_deleted(self):
+        response = self.client.get(self.url, {'movieinstance_page': 2})
+        data = change_form_data(response)
+        data['movieinstance_set-0-imprint'] = 'New imprint'
+        # A copy on the first page is deleted between showing the page and saving it.
+        MovieInstance.objects.get(imprint='Imprint 0').delete()
+        response = self.client.post(self.url + '?movieinstance_page=2', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(MovieInstance.objects.get(imprint='New imprint').due_back,
+                         datetime.date.today() + datetime.timedelta(days=20))
+        self.assertEqual(MovieInstance.objects.count(), 44)
+
+    def test_pages_do_not_overlap_on_equal_sort_keys(self):
+        MovieInstance.objects.update(due_back=None)
+        shown = []
+        for page in (1, 2, 3):
+            formset = self.inline_formset(self.client.get(self.url, {'movieinstance_page': page}))
+            shown += [form.instance.pk for form in formset.initial_forms]
+        self.assertEqual(len(set(shown)), 45)
+
+    def test_page_links_keep_other_parameters(self):
+        response = self.client.get(self.url, {'movie_page': 3, 'movieinstance_page': 2})
+        self.assertContains(response, '?movie_page=3&amp;movieinstance_page=1')
+        self.assertContains(response, '?movie_page=3&amp;movieinstance_page=3')
+
+    def test_summary_mode_shows_counts_without_inline(self):
+        response = self.client.get(self.url, {'summary': 1})
+        self.assertEqual(response.context['inline_admin_formsets'], [])
+        self.assertContains(response, '45 copies: 5 Maintenance, 10 On loan, 30 Available')
+        self.assertContains(response, 'Show related rows')
+
+    def test_author_summary_mode(self):
+        response = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]), {'summary': 1})
+        self.assertEqual(response.context['inline_admin_formsets'], [])
+        self.assertContains(response, '1 movie, 45 copies (30 available)')
+
+    def test_add_page(self):
+        response = self.client.get(reverse('admin:catalog_author_add'))
+        self.assertEqual(response.status_code, 200)
+
+
+from django.contrib.admin import helpers
+from django.contrib.auth.models import Permission
+
+from catalog import counters
+from catalog.models import StatusChange
+
+
+class BulkStatusActionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD')
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        for status in 'oooaad':
+            MovieInstance.objects.create(movie=movie, imprint='Imprint', status=status,
+                                         borrower=cls.admin_user if status == 'o' else None)
+
+    def setUp(self):
+        self.client.login(username='admin', password='2HJ1vRV0Z&3iD')
+        self.url = reverse('admin:catalog_movieinstance_changelist')
+
+    def test_select_across_filtered_changelist(self):
+        data = {'action': 'mark_returned', 'select_across': '1', 'index': '0',
+                helpers.ACTION_CHECKBOX_NAME: [MovieInstance.objects.filter(status='o').first().pk]}
+        response = self.client.post(self.url + '?status__exact=o', data, follow=True)
+        self.assertContains(response, 'Returned 3 copies.')
+        self.assertFalse(MovieInstance.objects.filter(status='o').exists())
+        self.assertEqual(StatusChange.objects.filter(action='return', changed_by=self.admin_user).count(), 3)
+        self.assertEqual(counters.reconcile(), {})
+
+    def test_selected_copies_only(self):
+        selected = list(MovieInstance.objects.filter(status='a').values_list('pk', flat=True))[:1]
+        data = {'action': 'send_to_maintenance', 'index': '0', helpers.ACTION_CHECKBOX_NAME: selected}
+        response = self.client.post(self.url, data, follow=True)
+        self.assertContains(response, 'Sent to maintenance 1 copy.')
+        self.assertEqual(MovieInstance.objects.filter(status='d').count(), 2)
+        self.assertEqual(MovieInstance.objects.filter(status='a').count(), 1)
+
+    def test_actions_need_permission(self):
+        User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True).user_permissions.set(
+            Permission.objects.filter(codename='view_movieinstance'))
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        data = {'action': 'make_available', 'select_across': '1', 'index': '0',
+                helpers.ACTION_CHECKBOX_NAME: [MovieInstance.objects.first().pk]}
+        self.client.post(self.url, data)
+        self.assertEqual(MovieInstance.objects.filter(status='a').count(), 2)
+        self.assertEqual(MovieInstance.objects.filter(status='d').count(), 1)
+        self.assertFalse(StatusChange.objects.exists())
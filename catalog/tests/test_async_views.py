@@ -0,0 +1,104 @@
+import threading
+from importlib import import_module
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from catalog import async_views, counters, metrics
+from catalog.models import Author, Movie
+
+
+def make_request(path):
+    """Returns an anonymous GET request with a session, as the middleware would set it up."""
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    return request
+
+
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for number in range(13):
+            Movie.objects.create(title='Movie {0:02d}'.format(number), summary='Summary', isbn=str(number),
+                                 author=author)
+
+    def test_index_renders_counts_and_visits(self):
+        request = make_request('/catalog/')
+        for expected_visits in (1, 2):
+            response = async_to_sync(async_views.index)(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '<strong>Peliculas:</strong> 13')
+            self.assertContains(response, 'Visitaste esta pagina {0} veces.'.format(expected_visits))
+
+    def test_movie_list_pages(self):
+        response = async_to_sync(async_views.movie_list)(make_request('/catalog/movies/?page=2'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Movie 10')
+        self.assertNotContains(response, 'Movie 09')
+        self.assertContains(response, 'Page 2 of 2.')
+
+    def test_movie_list_matches_sync_view(self):
+        for page in ('1', '2', 'last'):
+            path = '/catalog/movies/?page={0}'.format(page)
+            sync_response = self.client.get(path)
+            response = async_to_sync(async_views.movie_list)(make_request(path))
+            self.assertEqual(response.content, sync_response.content)
+
+    def test_author_list(self):
+        response = async_to_sync(async_views.author_list)(make_request('/catalog/authors/'))
+        self.assertContains(response, 'Smith, John')
+
+    def test_invalid_pages(self):
+        for page in ('0', '3', 'x'):
+            with self.assertRaises(Http404):
+                async_to_sync(async_views.movie_list)(make_request('/catalog/movies/?page={0}'.format(page)))
+
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_uses_sync_view(self):
+        response = async_to_sync(async_views.movie_list)(make_request('/catalog/movies/'))
+        response.render()
+        self.assertTrue(response.context_data['page_obj'].is_cursor_page)
+
+
+class RunConcurrentlyTest(TransactionTestCase):
+    """Outside a transaction the queries run in worker threads, at the same time."""
+
+    def setUp(self):
+        counters.reconcile()
+
+    def test_functions_overlap(self):
+        # Each function waits for the other, which only returns if they run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(async_views.run_concurrently)(barrier.wait, barrier.wait)
+        self.assertEqual(sorted(results), [0, 1])
+
+    def test_queries_count_in_request_metrics(self):
+        statements = []
+
+        class RecordingMetrics(metrics.RequestMetrics):
+            def __call__(self, execute, sql, params, many, context):
+                statements.append(sql)
+                return super().__call__(execute, sql, params, many, context)
+
+        request_metrics = RecordingMetrics()
+        token = metrics._current.set(request_metrics)
+        try:
+            results = async_to_sync(async_views.run_concurrently)(Movie.objects.count, Author.objects.count)
+        finally:
+            metrics._current.reset(token)
+        self.assertEqual(results, [0, 0])
+        # The worker threads' new connections also run the backend's setup statements.
+        counts = [sql for sql in statements if sql.startswith('SELECT COUNT(*)')]
+        self.assertEqual(len(counts), 2)
+        self.assertEqual(request_metrics.queries, len(statements))
+
+    def test_movie_list(self):
+        Movie.objects.create(title='Movie Title', summary='Summary', isbn='1')
+        response = async_to_sync(async_views.movie_list)(make_request('/catalog/movies/'))
+        self.assertContains(response, 'Movie Title')
@@ -0,0 +1,288 @@
+from django.test import TestCase
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+
+from catalog import counters, search
+from catalog.models import Author, CatalogCounter, Genre, Language, Movie, MovieInstance
+
+
+class ImportCatalogCommandTest(TestCase):
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_file(self, path, **options):
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        path = self.write_file('.csv', (
+            'isbn,title,summary,author_first_name,author_last_name,language,genres,copies,imprint\n'
+            '1,Alien,Space horror,Ridley,Scott,English,Horror|Science Fiction,2,Fox\n'
+            '2,Blade Runner,Replicants,Ridley,Scott,English,Science Fiction,1,Warner\n'
+            ',No ISBN,Skipped,,,,,,\n'))
+        output = self.import_file(path, batch_size=1)
+
+        self.assertIn('Imported 3 rows (2 movies created, 0 updated, 1 authors and 3 copies created, 1 skipped)',
+                      output)
+        alien = Movie.objects.get(isbn='1')
+        self.assertEqual(str(alien.author), 'Scott, Ridley')
+        self.assertEqual(alien.language.name, 'English')
+        self.assertEqual(sorted(genre.name for genre in alien.genre.all()), ['Horror', 'Science Fiction'])
+        self.assertEqual(alien.movieinstance_set.filter(status='a', imprint='Fox').count(), 2)
+        self.assertEqual(Genre.objects.count(), 2)
+
+    def test_import_jsonl_upserts_on_isbn(self):
+        first = self.write_file('.jsonl', json.dumps({
+            'isbn': '1', 'title': 'Alien', 'summary': 'Space horror', 'author_first_name': 'Ridley',
+            'author_last_name': 'Scott', 'genres': ['Horror'], 'copies': 2}) + '\n')
+        self.import_file(first)
+        second = self.write_file('.jsonl', json.dumps({
+            'isbn': '1', 'title': 'Alien (Director\'s Cut)', 'summary': 'Space horror',
+            'author_first_name': 'Ridley', 'author_last_name': 'Scott', 'genres': ['Science Fiction'],
+            'copies': 3}) + '\n')
+        output = self.import_file(second)
+
+        self.assertIn('0 movies created, 1 updated, 0 authors and 1 copies created', output)
+        movie = Movie.objects.get()
+        self.assertEqual(movie.title, 'Alien (Director\'s Cut)')
+        self.assertEqual([genre.name for genre in movie.genre.all()], ['Science Fiction'])
+        self.assertEqual(MovieInstance.objects.count(), 3)
+        self.assertEqual((movie.total_copies, movie.available_copies), (3, 3))
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_import_keeps_counters_and_search_index_current(self):
+        path = self.write_file('.jsonl', json.dumps({
+            'isbn': '1', 'title': 'Alien', 'summary': 'Space horror', 'author_first_name': 'Ridley',
+            'author_last_name': 'Scott', 'copies': 2}) + '\n')
+        self.import_file(path)
+        self.assertEqual(counters.read(), {
+            'num_movies': 1, 'num_instances': 2, 'num_instances_available': 2, 'num_authors': 1})
+        self.assertEqual(counters.reconcile(), {})
+        self.assertEqual([result.movie_id for result in search.search('scott')], [Movie.objects.get().pk])
+
+
+class ReconcileCountersCommandTest(TestCase):
+
+    def test_repairs_drifted_counters(self):
+        movie = Movie.objects.create(title='Alien', summary='Space horror', isbn='1')
+        MovieInstance.objects.create(movie=movie, imprint='Fox', status='a')
+        MovieInstance.objects.create(movie=movie, imprint='Fox', status='o')
+        CatalogCounter.objects.filter(name=counters.NUM_INSTANCES_AVAILABLE).update(value=5)
+        CatalogCounter.objects.filter(name=counters.NUM_AUTHORS).delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('num_instances_available: 5 -> 1', out.getvalue())
+        self.assertIn('num_authors: None -> 0', out.getvalue())
+        self.assertIn('Reconciled 4 counters (2 corrected).', out.getvalue())
+        self.assertEqual(counters.read(), {
+            'num_movies': 1, 'num_instances': 2, 'num_instances_available': 1, 'num_authors': 0})
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Reconciled 4 counters (0 corrected).', out.getvalue())
+
+
+class ReconcileCopyCountsCommandTest(TestCase):
+
+    def test_repairs_drifted_movies_in_chunks(self):
+        movies = [Movie.objects.create(title='Movie {0}'.format(i), summary='Summary', isbn=str(i)) for i in range(5)]
+        for movie in movies:
+            MovieInstance.objects.create(movie=movie, imprint='Imprint', status='a')
+        # Bulk updates bypass the signals, so the copy counts drift until repaired.
+        MovieInstance.objects.filter(movie__in=movies[1:4]).update(status='o')
+        Movie.objects.filter(pk=movies[4].pk).update(total_copies=7)
+
+        out = StringIO()
+        call_command('reconcile_copy_counts', chunk_size=2, stdout=out)
+        self.assertIn('Corrected the copy counts of 4 movies.', out.getvalue())
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('total_copies', 'available_copies')),
+                         [(1, 1), (1, 0), (1, 0), (1, 0), (1, 1)])
+
+
+class ExportCatalogCommandTest(TestCase):
+
+    def test_export_roundtrips_through_import(self):
+        author = Author.objects.create(first_name='Ridley', last_name='Scott')
+        movie = Movie.objects.create(title='Alien', summary='Space horror', isbn='1', author=author)
+        movie.genre.set([Genre.objects.create(name='Horror')])
+        MovieInstance.objects.create(movie=movie, imprint='Fox', status='a')
+
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_catalog', format='ndjson', output=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['isbn'], '1')
+        self.assertEqual(records[0]['genres'], ['Horror'])
+        self.assertEqual(records[0]['copies'][0]['imprint'], 'Fox')
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+
+    def test_rebuild_restores_search_results(self):
+        author = Author.objects.create(first_name='Ridley', last_name='Scott')
+        alien = Movie.objects.create(title='Alien', summary='Space horror', isbn='1', author=author)
+        blade_runner = Movie.objects.create(title='Blade Runner', summary='Replicants', isbn='2', author=author)
+        Movie.objects.create(title='Heat', summary='Heist', isbn='3')
+        search.get_backend().clear()
+        self.assertEqual(search.search('scott'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', chunk_size=2, stdout=out)
+        self.assertIn('Indexed 3 movies', out.getvalue())
+        self.assertEqual({result.movie_id for result in search.search('scott')}, {alien.pk, blade_runner.pk})
+        self.assertEqual([result.movie_id for result in search.search('replicants')], [blade_runner.pk])
+
+
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+
+
+class SeedCatalogCommandTest(TestCase):
+
+    def seed(self):
+        call_command('seed_catalog', movies=30, copies=3, authors=5, users=10, seed=7, stdout=StringIO())
+        return (list(Movie.objects.order_by('isbn').values_list('isbn', 'title', 'total_copies', 'available_copies')),
+                list(MovieInstance.objects.order_by('id').values_list('id', 'status', 'borrower__username')))
+
+    def test_seeds_consistent_catalog(self):
+        self.seed()
+        self.assertEqual(Movie.objects.count(), 30)
+        self.assertEqual(User.objects.filter(username__startswith='reader').count(), 10)
+        self.assertTrue(MovieInstance.objects.filter(status__exact='o', borrower__isnull=False).exists())
+        self.assertEqual(counters.reconcile(), {})
+        self.assertEqual(counters.repair_copies(), 0)
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_same_seed_gives_same_data(self):
+        first = self.seed()
+        MovieInstance.objects.all().delete()
+        Movie.objects.all().delete()
+        for model in (Author, Genre, Language, User):
+            model.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+
+
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+
+from catalog import notifications
+from catalog.models import OverdueNotice
+
+
+class CountingEmailBackend(EmailBackend):
+    """The test email backend, counting the connections opened and the batches sent."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.opened = self.batches = 0
+
+    def open(self):
+        self.opened += 1
+
+    def send_messages(self, messages):
+        self.batches += 1
+        return super().send_messages(messages)
+
+
+class NotifyOverdueCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        cls.movie = Movie.objects.create(title='Alien', summary='Space horror', isbn='1')
+        cls.users = [User.objects.create_user('reader{0}'.format(number), 'reader{0}@example.com'.format(number))
+                     for number in range(3)]
+
+    def lend(self, borrower, days_overdue, status='o'):
+        return MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status=status, borrower=borrower,
+                                            due_back=self.today - datetime.timedelta(days=days_overdue))
+
+    def notify(self, **options):
+        out = StringIO()
+        call_command('notify_overdue', stdout=out, **options)
+        return out.getvalue()
+
+    def test_one_digest_per_borrower(self):
+        first = [self.lend(self.users[0], 3), self.lend(self.users[0], 1)]
+        second = self.lend(self.users[1], 2)
+        self.lend(self.users[1], 0)  # Due today, not overdue yet.
+        self.lend(self.users[2], 5, status='a')  # Returned.
+
+        output = self.notify()
+
+        self.assertIn('Sent 2 overdue digests covering 3 loans', output)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['reader0@example.com', 'reader1@example.com'])
+        digest = next(message for message in mail.outbox if message.to == ['reader0@example.com'])
+        self.assertEqual(digest.subject, '2 of your loans are overdue')
+        for loan in first:
+            self.assertIn(str(loan.id), digest.body)
+        self.assertEqual(set(OverdueNotice.objects.values_list('movie_instance_id', flat=True)),
+                         {first[0].id, first[1].id, second.id})
+
+    def test_rerun_does_not_resend(self):
+        loan = self.lend(self.users[0], 3)
+        self.notify()
+        self.assertIn('Sent 0 overdue digests', self.notify())
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Renewed, then overdue again: a new notice is due.
+        MovieInstance.objects.filter(pk=loan.pk).update(due_back=self.today - datetime.timedelta(days=1))
+        self.notify()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, 'Your loan of Alien is overdue')
+
+    def test_borrowers_without_email_are_skipped(self):
+        self.lend(User.objects.create_user('noemail'), 3)
+        self.assertIn('Sent 0 overdue digests covering 0 loans', self.notify())
+        self.assertFalse(OverdueNotice.objects.exists())
+
+    def test_dry_run(self):
+        self.lend(self.users[0], 3)
+        self.assertIn('Would send 1 overdue digests', self.notify(dry_run=True))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(OverdueNotice.objects.exists())
+
+    def test_overdue_loans_in_one_query(self):
+        for user in self.users:
+            self.lend(user, 3)
+        with self.assertNumQueries(1):
+            groups = list(notifications.group_by_borrower(notifications.overdue_loans(self.today)))
+        self.assertEqual([borrower for borrower, loans in groups], self.users)
+
+    def test_batches_share_one_connection(self):
+        for user in self.users:
+            self.lend(user, 3)
+        connection = CountingEmailBackend()
+        result = notifications.notify_overdue(batch_size=2, connection=connection)
+        self.assertEqual(result, notifications.NotifyResult(digests=3, loans=3, skipped=0))
+        self.assertEqual((connection.opened, connection.batches), (1, 2))
+
+    def test_rate_limit(self):
+        for user in self.users:
+            self.lend(user, 3)
+        with mock.patch('catalog.notifications.time.sleep') as sleep:
+            notifications.notify_overdue(batch_size=1, rate=1)
+        # Three messages at one per second: the run waits after each batch.
+        self.assertEqual(sleep.call_count, 3)
+        self.assertTrue(all(0 < call.args[0] <= 3 for call in sleep.call_args_list))
@@ -0,0 +1,167 @@
+import datetime
+import threading
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase
+
+from catalog import counters, loans
+from catalog.models import Movie, MovieInstance, StatusChange
+
+
+class LoanServiceTest(TestCase):
+
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.other = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        self.copy = MovieInstance.objects.create(movie=movie, imprint='Unlikely Imprint, 2016', status='a')
+
+    def assertCopy(self, status, borrower, due_back):
+        copy = MovieInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), (status, borrower, due_back))
+        self.assertEqual(counters.reconcile(), {})
+
+    def test_checkout_and_return(self):
+        result = loans.checkout(self.copy.pk, self.borrower)
+        self.assertEqual(result, (loans.SUCCESS, self.copy.pk, 'o'))
+        self.assertTrue(result.ok)
+        self.assertCopy('o', self.borrower, datetime.date.today() + loans.LOAN_PERIOD)
+
+        self.assertTrue(loans.return_copy(self.copy.pk).ok)
+        self.assertCopy('a', None, None)
+
+    def test_conflicts(self):
+        loans.checkout(self.copy.pk, self.borrower, datetime.date.today())
+        for result in (loans.checkout(self.copy.pk, self.other), loans.reserve(self.copy.pk, self.other)):
+            self.assertFalse(result.ok)
+            self.assertEqual(result, (loans.CONFLICT, self.copy.pk, 'o'))
+        self.assertCopy('o', self.borrower, datetime.date.today())
+
+        loans.return_copy(self.copy.pk)
+        self.assertEqual(loans.return_copy(self.copy.pk), (loans.CONFLICT, self.copy.pk, 'a'))
+
+    def test_missing_copy(self):
+        self.copy.delete()
+        self.assertEqual(loans.checkout(self.copy.pk, self.borrower), (loans.NOT_FOUND, self.copy.pk, None))
+
+    def test_reserved_copy_is_only_lent_to_its_borrower(self):
+        self.assertTrue(loans.reserve(self.copy.pk, self.borrower).ok)
+        self.assertCopy('r', self.borrower, None)
+        self.assertEqual(loans.checkout(self.copy.pk, self.other), (loans.CONFLICT, self.copy.pk, 'r'))
+        self.assertTrue(loans.checkout(self.copy.pk, self.borrower).ok)
+        self.assertCopy('o', self.borrower, datetime.date.today() + loans.LOAN_PERIOD)
+
+
+class BulkTransitionTest(TestCase):
+
+    def setUp(self):
+        self.librarian = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.movies = [Movie.objects.create(title='Movie {0}'.format(number), summary='Summary',
+                                             isbn='ISBN{0}'.format(number))
+                       for number in range(2)]
+        for movie in self.movies:
+            for status in 'aaorrd':
+                lent = status in 'or'
+                MovieInstance.objects.create(movie=movie, imprint='Imprint', status=status,
+                                             borrower=self.librarian if lent else None,
+                                             due_back=datetime.date.today() if lent else None)
+
+    def assertStatusCounts(self, **counts):
+        for status, count in counts.items():
+            self.assertEqual(MovieInstance.objects.filter(status=status).count(), count, status)
+
+    def test_return_copies(self):
+        self.assertEqual(loans.return_copies(MovieInstance.objects.all(), self.librarian), 2)
+        self.assertStatusCounts(a=6, d=2, o=0, r=4)
+        self.assertFalse(MovieInstance.objects.filter(status='a', borrower__isnull=False).exists())
+        self.assertEqual(counters.reconcile(), {})
+        self.assertEqual(StatusChange.objects.filter(action='return', from_status='o', to_status='a',
+                                                     changed_by=self.librarian).count(), 2)
+
+    def test_send_to_maintenance_leaves_loans_alone(self):
+        self.assertEqual(loans.send_to_maintenance(MovieInstance.objects.filter(movie=self.movies[0])), 4)
+        self.assertStatusCounts(a=2, d=6, o=2, r=2)
+        self.assertEqual(counters.reconcile(), {})
+        self.assertEqual(sorted(StatusChange.objects.values_list('from_status', flat=True)), ['a', 'a', 'r', 'r'])
+
+    def test_make_available(self):
+        self.assertEqual(loans.make_available(MovieInstance.objects.all()), 6)
+        self.assertStatusCounts(a=10, d=0, o=2, r=0)
+        self.assertEqual(counters.reconcile(), {})
+        self.assertEqual(Movie.objects.get(pk=self.movies[1].pk).available_copies, 5)
+
+    def test_renew_records_due_date(self):
+        due_back = datetime.date.today() + loans.LOAN_PERIOD
+        self.assertEqual(loans.renew(MovieInstance.objects.all(), due_back), 2)
+        self.assertEqual(list(StatusChange.objects.values_list('from_status', 'to_status', 'due_back')),
+                         [('o', 'o', due_back)] * 2)
+
+    def test_batches(self):
+        with self.assertNumQueries(9):
+            # Read the ids, insert 2 batches, adjust the counters (count, total, movies), update.
+            self.assertEqual(loans.bulk_transition(MovieInstance.objects.all(), ['d', 'r'], 'a', 'available', batch_size=4), 6)
+        self.assertEqual(StatusChange.objects.count(), 6)
+
+    def test_nothing_to_change(self):
+        self.assertEqual(loans.return_copies(MovieInstance.objects.filter(status='a')), 0)
+        self.assertFalse(StatusChange.objects.exists())
+
+
+class LoanConcurrencyTest(TransactionTestCase):
+    """Many threads race to lend the same few copies; each copy must be lent exactly once."""
+    num_threads = 16
+    num_copies = 5
+
+    def setUp(self):
+        self.borrowers = [User.objects.create_user(username='borrower{0}'.format(i)) for i in range(self.num_threads)]
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        self.copies = [MovieInstance.objects.create(movie=movie, imprint='Imprint', status='a').pk
+                       for _ in range(self.num_copies)]
+        # The database flush before each test also empties the counters table.
+        counters.reconcile()
+
+    def retry_locked(self, operation, *args):
+        # SQLite allows a single writer and reports others as locked; they try again, like a busy timeout.
+        while True:
+            try:
+                return operation(*args)
+            except OperationalError:
+                if connection.vendor != 'sqlite':
+                    raise
+
+    def race(self, operation, copy_args):
+        """Runs operation for every copy in every thread, all starting together; returns the successes."""
+        successes = []
+        barrier = threading.Barrier(self.num_threads)
+
+        def worker(borrower):
+            try:
+                barrier.wait()
+                for args in copy_args(borrower):
+                    if self.retry_locked(operation, *args).ok:
+                        successes.append((args[0], borrower.pk))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(borrower,)) for borrower in self.borrowers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return successes
+
+    def test_no_double_lends(self):
+        successes = self.race(loans.checkout, lambda borrower: [(copy_id, borrower) for copy_id in self.copies])
+        self.assertEqual(sorted(copy_id for copy_id, _ in successes), sorted(self.copies))
+        for copy_id, borrower_id in successes:
+            copy = MovieInstance.objects.get(pk=copy_id)
+            self.assertEqual((copy.status, copy.borrower_id), ('o', borrower_id))
+        self.assertEqual(counters.reconcile(), {})
+
+    def test_each_copy_returned_once(self):
+        for copy_id, borrower in zip(self.copies, self.borrowers):
+            loans.checkout(copy_id, borrower)
+        successes = self.race(loans.return_copy, lambda borrower: [(copy_id,) for copy_id in self.copies])
+        self.assertEqual(sorted(copy_id for copy_id, _ in successes), sorted(self.copies))
+        self.assertEqual(counters.reconcile(), {})
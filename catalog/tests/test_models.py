@@ -52,3 +52,93 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         # This will also fail if the urlconf is not defined.
         self.assertEqual(author.get_absolute_url(), '/catalog/author/1')
+
+
+from catalog import counters
+from catalog.models import CatalogCounter, Movie, MovieInstance
+
+
+class CatalogCounterTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary',
+                                          isbn='ABCDEFG', author=self.author)
+
+    def test_counts_created_objects(self):
+        MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='a')
+        MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='o')
+        self.assertEqual(counters.read(), {
+            'num_movies': 1, 'num_instances': 2, 'num_instances_available': 1, 'num_authors': 1})
+
+    def test_counts_status_changes(self):
+        copy = MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='o')
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(counters.read()['num_instances_available'], 1)
+        copy.status = 'r'
+        copy.save()
+        self.assertEqual(counters.read()['num_instances_available'], 0)
+
+    def test_counts_deleted_objects(self):
+        MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='a')
+        MovieInstance.objects.all().delete()
+        self.movie.delete()
+        self.author.delete()
+        self.assertEqual(counters.read(), {
+            'num_movies': 0, 'num_instances': 0, 'num_instances_available': 0, 'num_authors': 0})
+
+    def test_reconcile_repairs_drift(self):
+        MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='o')
+        # Bulk updates bypass the signals, so the counter drifts until reconciled.
+        MovieInstance.objects.update(status='a')
+        self.assertEqual(counters.read()['num_instances_available'], 0)
+        drift = counters.reconcile()
+        self.assertEqual(drift, {'num_instances_available': (0, 1)})
+        self.assertEqual(counters.read()['num_instances_available'], 1)
+
+    def test_missing_counter_row_is_rebuilt(self):
+        CatalogCounter.objects.all().delete()
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        self.assertEqual(counters.read()['num_authors'], 2)
+
+
+from catalog import loans
+
+
+class MovieCopyCountsTest(TestCase):
+
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        self.other = Movie.objects.create(title='Other Title', summary='My movie summary', isbn='HIJKLMN')
+
+    def assertCopyCounts(self, movie, total, available):
+        movie.refresh_from_db()
+        self.assertEqual((movie.total_copies, movie.available_copies), (total, available))
+
+    def test_counts_created_and_deleted_copies(self):
+        available = MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='a')
+        MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='o')
+        self.assertCopyCounts(self.movie, 2, 1)
+        MovieInstance.objects.get(pk=available.pk).delete()
+        self.assertCopyCounts(self.movie, 1, 0)
+
+    def test_counts_status_and_movie_changes(self):
+        copy = MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='o')
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.save()
+        self.assertCopyCounts(self.movie, 1, 1)
+        copy.movie = self.other
+        copy.save()
+        self.assertCopyCounts(self.movie, 0, 0)
+        self.assertCopyCounts(self.other, 1, 1)
+
+    def test_counts_loan_operations(self):
+        copy = MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='a')
+        loans.checkout(copy.pk, None)
+        self.assertCopyCounts(self.movie, 1, 0)
+        loans.return_copy(copy.pk)
+        self.assertCopyCounts(self.movie, 1, 1)
+        self.assertEqual(counters.repair_copies(), 0)
@@ -0,0 +1,130 @@
+from django.test import TestCase
+
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.urls import reverse
+
+from catalog.models import Author, Genre, Language, Movie, MovieInstance, StatusChange
+from catalog.tests.query_budget import QueryBudgetMixin
+from catalog.urls import urlpatterns
+
+
+class CatalogQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Checks every view in catalog/urls.py against its query budget, and that
+    the number of queries does not grow with the amount of related data."""
+
+    def setUp(self):
+        self.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD', is_staff=True)
+        self.librarian.user_permissions.add(Permission.objects.get(name='Set movie as returned'))
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.language = Language.objects.create(name='English')
+        self.genres = [Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Drama')]
+        self.movie_count = 0
+        self.movie = self.add_movie()
+        self.copy = MovieInstance.objects.filter(movie=self.movie).first()
+
+    def add_movie(self, copies=2):
+        """Adds a movie by self.author with copies on loan to the librarian."""
+        self.movie_count += 1
+        movie = Movie.objects.create(title='Movie {0}'.format(self.movie_count), summary='Summary',
+                                     isbn='ISBN{0}'.format(self.movie_count), author=self.author,
+                                     language=self.language)
+        movie.genre.set(self.genres)
+        for _ in range(copies):
+            MovieInstance.objects.create(movie=movie, imprint='Imprint', status='o', borrower=self.librarian,
+                                         due_back=datetime.date.today() + datetime.timedelta(days=3))
+        return movie
+
+    def grow_catalog(self):
+        """Adds more movies by the same author, more copies and more loans."""
+        for _ in range(4):
+            self.add_movie(copies=3)
+        for _ in range(5):
+            MovieInstance.objects.create(movie=self.movie, imprint='Imprint', status='a')
+
+    def url_for(self, url_name):
+        kwargs = {
+            'movie-detail': {'pk': self.movie.pk},
+            'movie-update': {'pk': self.movie.pk},
+            'movie-delete': {'pk': self.movie.pk},
+            'author-detail': {'pk': self.author.pk},
+            'author-update': {'pk': self.author.pk},
+            'author-delete': {'pk': self.author.pk},
+            'renew-movie-librarian': {'pk': self.copy.pk},
+        }.get(url_name, {})
+        if url_name == 'movie-search':
+            return reverse(url_name) + '?q=movie'
+        return reverse(url_name, kwargs=kwargs)
+
+    def test_every_catalog_view_has_a_budget(self):
+        url_names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(url_names, set(self.query_budgets))
+
+    def test_views_within_budget_regardless_of_catalog_size(self):
+        url_names = [pattern.name for pattern in urlpatterns]
+        small = {url_name: self.assertWithinQueryBudget(url_name, self.url_for(url_name))
+                 for url_name in url_names}
+        self.grow_catalog()
+        for url_name in url_names:
+            with self.subTest(url_name=url_name):
+                num_queries = self.assertWithinQueryBudget(url_name, self.url_for(url_name))
+                self.assertEqual(num_queries, small[url_name])
+
+
+from django.contrib import admin
+
+from catalog.tests.query_budget import ADMIN_CHANGELIST_BUDGETS
+
+
+class AdminChangelistQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Checks that the admin changelist of every catalog model issues the same number
+    of queries however many rows it lists."""
+    query_budgets = ADMIN_CHANGELIST_BUDGETS
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD')
+        self.client.login(username='admin', password='2HJ1vRV0Z&3iD')
+        self.rows = 0
+
+    def add_rows(self, count):
+        """Adds movies with an author, a language, genres and copies on loan."""
+        genres = [Genre.objects.create(name='Genre {0}'.format(self.rows * 4 + number)) for number in range(4)]
+        for _ in range(count):
+            self.rows += 1
+            author = Author.objects.create(first_name='First', last_name='Last {0}'.format(self.rows))
+            movie = Movie.objects.create(title='Movie {0}'.format(self.rows), summary='Summary',
+                                         isbn='ISBN{0}'.format(self.rows), author=author,
+                                         language=Language.objects.create(name='Language {0}'.format(self.rows)))
+            movie.genre.set(genres)
+            copy = MovieInstance.objects.create(movie=movie, imprint='Imprint', status='o', borrower=self.admin_user,
+                                                due_back=datetime.date.today())
+            StatusChange.objects.create(movie_instance=copy, action='renew', from_status='o', to_status='o',
+                                        due_back=copy.due_back, changed_by=self.admin_user)
+
+    def changelists(self):
+        return ['admin:{0}_{1}_changelist'.format(model._meta.app_label, model._meta.model_name)
+                for model in admin.site._registry if model._meta.app_label == 'catalog']
+
+    def test_every_catalog_changelist_has_a_budget(self):
+        self.assertEqual(set(self.changelists()), set(self.query_budgets))
+
+    def test_changelists_within_budget_regardless_of_rows(self):
+        self.add_rows(2)
+        small = {url_name: self.assertWithinQueryBudget(url_name, reverse(url_name))
+                 for url_name in self.changelists()}
+        self.add_rows(30)
+        for url_name in self.changelists():
+            with self.subTest(url_name=url_name):
+                num_queries = self.assertWithinQueryBudget(url_name, reverse(url_name))
+                self.assertEqual(num_queries, small[url_name])
+
+    def test_filtered_changelist_is_counted(self):
+        self.add_rows(3)
+        MovieInstance.objects.filter(movie__title='Movie 1').update(status='a')
+        response = self.client.get(reverse('admin:catalog_movieinstance_changelist') + '?status__exact=o')
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response = self.client.get(reverse('admin:catalog_movieinstance_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 3)
@@ -0,0 +1,153 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from catalog import routers
+from catalog.models import Movie, MovieInstance
+
+
+@override_settings(CATALOG_REPLICAS=['replica1'], CATALOG_REPLICA_APPS=['catalog'])
+class ReplicaRouterTest(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        # Each test starts unpinned, as a fresh request would.
+        self.addCleanup(routers._state.reset, routers._state.set(None))
+        self.router = routers.ReplicaRouter()
+
+    def test_catalog_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+        self.assertEqual(self.router.db_for_read(MovieInstance), 'replica1')
+
+    def test_other_apps_read_from_primary(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    @override_settings(CATALOG_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.router.db_for_read(Movie), 'default')
+        self.router.db_for_write(Movie)
+        self.assertFalse(routers.is_pinned())
+
+    def test_writes_go_to_primary_and_pin_reads(self):
+        self.assertEqual(self.router.db_for_write(Movie), 'default')
+        self.assertEqual(self.router.db_for_read(Movie), 'default')
+
+    def test_writes_to_other_apps_do_not_pin(self):
+        self.router.db_for_write(User)
+        self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Movie), 'default')
+        self.assertEqual(self.router.db_for_read(Movie), 'replica1')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'catalog'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'catalog'))
+
+
+@override_settings(CATALOG_REPLICAS=['replica1'], CATALOG_REPLICA_APPS=['catalog'], CATALOG_REPLICA_PIN_SECONDS=5)
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.addCleanup(routers._state.reset, routers._state.set(None))
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.read_from = None
+
+    def view(self, write):
+        def view(request):
+            if write:
+                self.router.db_for_write(MovieInstance)
+            self.read_from = self.router.db_for_read(Movie)
+            return HttpResponse()
+        return view
+
+    def test_read_only_request(self):
+        response = routers.ReplicaPinningMiddleware(self.view(write=False))(self.factory.get('/'))
+        self.assertEqual(self.read_from, 'replica1')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_write_sets_pin_cookie(self):
+        response = routers.ReplicaPinningMiddleware(self.view(write=True))(self.factory.post('/'))
+        self.assertEqual(self.read_from, 'default')
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 5)
+        # The pin does not leak out of the request.
+        self.assertFalse(routers.is_pinned())
+
+    def test_pin_cookie_reads_from_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        response = routers.ReplicaPinningMiddleware(self.view(write=False))(request)
+        self.assertEqual(self.read_from, 'default')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    @override_settings(CATALOG_REPLICAS=[])
+    def test_unused_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            routers.ReplicaPinningMiddleware(self.view(write=False))
+
+
+from django.test import TransactionTestCase
+
+from catalog.models import Genre
+
+
+class ReplicaDatabaseTest(TransactionTestCase):
+    """Reads and writes against a real second database, holding different rows than the primary.
+
+    Not a TestCase: its transaction on the primary would pin every read to it.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # Enabled per test, so the replica is no longer excluded from migrations (and flushes) after it.
+        settings = override_settings(CATALOG_REPLICAS=['replica'], CATALOG_REPLICA_APPS=['catalog'],
+                                     CATALOG_REPLICA_PIN_SECONDS=5)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(routers._state.reset, routers._state.set(None))
+        Genre.objects.using('default').create(name='On the primary')
+        Genre.objects.using('replica').create(name='On the replica')
+
+    def genre_names(self):
+        return sorted(Genre.objects.values_list('name', flat=True))
+
+    def view(self, request):
+        if request.method == 'POST':
+            Genre.objects.create(name='Written')
+        return HttpResponse(', '.join(self.genre_names()))
+
+    def request(self, method, cookies=None):
+        request = RequestFactory().generic(method, '/')
+        request.COOKIES.update(cookies or {})
+        return routers.ReplicaPinningMiddleware(self.view)(request)
+
+    def test_unpinned_reads_go_to_replica(self):
+        self.assertEqual(self.genre_names(), ['On the replica'])
+
+    def test_write_pins_following_reads(self):
+        Genre.objects.create(name='Written')
+        self.assertEqual(self.genre_names(), ['On the primary', 'Written'])
+        self.assertFalse(Genre.objects.using('replica').filter(name='Written').exists())
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.genre_names(), ['On the primary'])
+        self.assertEqual(self.genre_names(), ['On the replica'])
+
+    def test_request_reads_its_writes(self):
+        response = self.request('GET')
+        self.assertEqual(response.content, b'On the replica')
+
+        response = self.request('POST')
+        self.assertEqual(response.content, b'On the primary, Written')
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        # The pin ends with the request...
+        self.assertEqual(self.genre_names(), ['On the replica'])
+        # ...but the cookie keeps the client's next requests on the primary.
+        response = self.request('GET', cookies={routers.PIN_COOKIE: '1'})
+        self.assertEqual(response.content, b'On the primary, Written')
@@ -0,0 +1,29 @@
+import unittest
+
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog.sqlite3.base import DatabaseWrapper
+
+
+@unittest.skipUnless(isinstance(connections['default'], DatabaseWrapper), 'Requires the catalog.sqlite3 backend')
+class TunedSqliteBackendTest(TransactionTestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA {0}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        # The test database lives in memory, where WAL does not apply.
+        self.assertIn(self.pragma('journal_mode'), ('wal', 'memory'))
+
+    def test_transactions_begin_immediate(self):
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                pass
+        self.assertIn('BEGIN IMMEDIATE', [query['sql'] for query in context.captured_queries])
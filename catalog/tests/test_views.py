@@ -292,6 +292,15 @@ class RenewMovieInstancesViewTest(TestCase):
                                     {'renewal_date': valid_date_in_future})
         self.assertRedirects(response, reverse('all-borrowed'))
 
+    def test_form_error_if_movie_returned_meanwhile(self):
+        login = self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        MovieInstance.objects.filter(pk=self.test_movieinstance1.pk).update(status='a', due_back=None)
+        valid_date_in_future = datetime.date.today() + datetime.timedelta(weeks=2)
+        response = self.client.post(reverse('renew-movie-librarian', kwargs={'pk': self.test_movieinstance1.pk}),
+                                    {'renewal_date': valid_date_in_future})
+        self.assertFormError(response, 'form', None, 'This movie is no longer on loan.')
+        self.assertIsNone(MovieInstance.objects.get(pk=self.test_movieinstance1.pk).due_back)
+
     def test_HTTP404_for_invalid_movie_if_logged_in(self):
         import uuid
         test_uid = uuid.uuid4()  # unlikely UID to match our movieinstance!
@@ -355,3 +364,734 @@ class AuthorCreateViewTest(TestCase):
         # Manually check redirect because we don't know what author was created
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith('/catalog/author/'))
+
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class IndexViewTest(TestCase):
+
+    def test_index_renders_counts_with_one_counter_query(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_movie = Movie.objects.create(title='Movie Title', summary='My movie summary',
+                                          isbn='ABCDEFG', author=test_author)
+        MovieInstance.objects.create(movie=test_movie, imprint='Unlikely Imprint, 2016', status='a')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('index'))
+        catalog_queries = [query['sql'] for query in context.captured_queries if 'catalog_' in query['sql']]
+        self.assertEqual(len(catalog_queries), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_movies'], 1)
+        self.assertEqual(response.context['num_instances'], 1)
+        self.assertEqual(response.context['num_instances_available'], 1)
+        self.assertEqual(response.context['num_authors'], 1)
+
+    def test_index_counts_visits_in_session(self):
+        for expected_visits in (1, 2, 3):
+            response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected_visits)
+        self.assertEqual(self.client.session['num_visits'], 4)
+
+
+from django.core.signals import request_finished
+from django.test import RequestFactory, override_settings
+from catalog import visits
+
+
+@override_settings(CATALOG_VISIT_COUNTING='buffered', CATALOG_VISIT_FLUSH_EVERY=5)
+class BufferedVisitCountingTest(TestCase):
+
+    def setUp(self):
+        visits.buffer.flush()
+
+    def tearDown(self):
+        visits.buffer.flush()
+
+    def test_buffered_visits_do_not_write_session(self):
+        self.client.get(reverse('index'))  # The first visit creates the session.
+        with CaptureQueriesContext(connection) as context:
+            for expected_visits in (2, 3, 4):
+                response = self.client.get(reverse('index'))
+                self.assertEqual(response.context['num_visits'], expected_visits)
+        session_writes = [query for query in context.captured_queries
+                          if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(session_writes, [])
+        self.assertEqual(self.client.session['num_visits'], 2)
+
+    def test_buffered_visits_are_flushed_in_batches(self):
+        for expected_visits in range(1, 8):
+            response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected_visits)
+        # Visits 2-6 were flushed as one batch, visit 7 is still buffered.
+        self.assertEqual(self.client.session['num_visits'], 7)
+        visits.buffer.flush()
+        self.assertEqual(self.client.session['num_visits'], 8)
+
+    def test_flush_waits_for_the_request_to_finish(self):
+        self.client.get(reverse('index'))
+        request = RequestFactory().get(reverse('index'))
+        request.session = self.client.session
+        for expected_visits in range(2, 8):
+            self.assertEqual(visits.count_visit(request), expected_visits)
+        # The buffer is due for a flush, but it is left to the end of the request.
+        self.assertEqual(self.client.session['num_visits'], 2)
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(self.client.session['num_visits'], 8)
+
+
+class AuthorDetailViewTest(TestCase):
+
+    def test_movies_with_copy_counts(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_movie = Movie.objects.create(title='Movie Title', summary='My movie summary',
+                                          isbn='ABCDEFG', author=test_author)
+        Movie.objects.create(title='Other Title', summary='My movie summary', isbn='HIJKLMN', author=test_author)
+        for status in ('a', 'a', 'o'):
+            MovieInstance.objects.create(movie=test_movie, imprint='Unlikely Imprint, 2016', status=status)
+
+        response = self.client.get(reverse('author-detail', kwargs={'pk': test_author.pk}))
+        self.assertEqual(response.status_code, 200)
+        counts = {movie.title: (movie.available_copies, movie.total_copies)
+                  for movie in response.context['movie_list']}
+        self.assertEqual(counts, {'Movie Title': (2, 3), 'Other Title': (0, 0)})
+        self.assertContains(response, '(2 of 3 available)')
+
+
+@override_settings(CATALOG_CURSOR_PAGINATION=True)
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for author_id in range(13):
+            Author.objects.create(first_name='Christian {0}'.format(author_id),
+                                  last_name='Surname {0:02d}'.format(author_id))
+        # Movies with equal titles and missing authors, to exercise the tiebreakers.
+        authors = list(Author.objects.all())
+        for movie_id in range(25):
+            Movie.objects.create(title='Movie {0}'.format(movie_id // 2), summary='My movie summary',
+                                 isbn='ISBN{0}'.format(movie_id),
+                                 author=authors[movie_id % 13] if movie_id % 3 else None)
+
+    def walk(self, url_name, list_name):
+        """Follows the next links from the first page, then the previous links back."""
+        pages = []
+        response = self.client.get(reverse(url_name))
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([item.pk for item in response.context[list_name]])
+            next_cursor = response.context['page_obj'].next_cursor
+            if next_cursor is None:
+                break
+            response = self.client.get(reverse(url_name) + '?cursor=' + next_cursor)
+        back = [pages[-1]]
+        while response.context['page_obj'].previous_cursor:
+            response = self.client.get(reverse(url_name) + '?cursor=' + response.context['page_obj'].previous_cursor)
+            back.insert(0, [item.pk for item in response.context[list_name]])
+        return pages, back
+
+    def test_author_pages(self):
+        pages, back = self.walk('authors', 'author_list')
+        self.assertEqual([len(page) for page in pages], [10, 3])
+        self.assertEqual(back, pages)
+        expected = list(Author.objects.order_by('last_name', 'first_name', 'id').values_list('pk', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_movie_pages_with_ties_and_null_authors(self):
+        pages, back = self.walk('movies', 'movie_list')
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(back, pages)
+        expected = list(Movie.objects.order_by('title', 'author_id', 'id').values_list('pk', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_cursor_links_rendered_without_page_count(self):
+        response = self.client.get(reverse('authors'))
+        self.assertContains(response, '?cursor=' + response.context['page_obj'].next_cursor)
+        self.assertNotContains(response, 'Page 1 of')
+
+    def test_invalid_cursor_is_404(self):
+        for cursor in ('garbage', 'WyJuIiwgWzFdXQ', 'WyJuIixbImEiLCJiIiwieCJdXQ'):
+            response = self.client.get(reverse('authors') + '?cursor=' + cursor)
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class MovieSearchViewTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='Ursula', last_name='Leguin')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.earthsea = Movie.objects.create(title='Wizard of Earthsea', summary='A young mage <b>learns</b> magic.',
+                                             isbn='1', author=self.author)
+        self.earthsea.genre.set([self.genre])
+        self.other = Movie.objects.create(title='Dispossessed', summary='An anarchist planet and a wizard.',
+                                          isbn='2')
+
+    def search(self, query):
+        response = self.client.get(reverse('movie-search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response, [movie.pk for movie in response.context['movie_list']]
+
+    def test_search_page_without_query(self):
+        response = self.client.get(reverse('movie-search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/movie_search.html')
+        self.assertEqual(response.context['movie_list'], [])
+
+    def test_matches_title_summary_author_and_genre(self):
+        self.assertEqual(self.search('earthsea')[1], [self.earthsea.pk])
+        self.assertEqual(self.search('anarchist')[1], [self.other.pk])
+        self.assertEqual(self.search('leguin')[1], [self.earthsea.pk])
+        self.assertEqual(self.search('fantasy')[1], [self.earthsea.pk])
+        self.assertEqual(self.search('nothing matches')[1], [])
+
+    def test_last_term_matches_prefix(self):
+        self.assertEqual(self.search('young ma')[1], [self.earthsea.pk])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('wizard')[1], [self.earthsea.pk, self.other.pk])
+
+    def test_snippet_marks_matches_and_escapes_html(self):
+        response, _ = self.search('mage')
+        self.assertContains(response, '<mark>mage</mark>')
+        self.assertContains(response, '&lt;b&gt;learns&lt;/b&gt;')
+
+    def test_index_follows_author_and_genre_changes(self):
+        self.author.last_name = 'Le Guin'
+        self.author.save()
+        self.assertEqual(self.search('guin')[1], [self.earthsea.pk])
+        self.earthsea.genre.remove(self.genre)
+        self.assertEqual(self.search('fantasy')[1], [])
+        self.author.delete()
+        self.assertEqual(self.search('guin')[1], [])
+
+    def test_deleted_movie_is_removed(self):
+        self.other.delete()
+        self.assertEqual(self.search('wizard')[1], [self.earthsea.pk])
+
+
+from django.test import RequestFactory
+from catalog.views import LoanedMoviesAllListView, LoanedMoviesByUserListView
+
+
+class LoanQueryIndexTest(TestCase):
+    """Checks with EXPLAIN that the loan queries are answered from an index, not a table scan."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        if connection.vendor == 'postgresql':
+            # The planner prefers a sequential scan on tiny test tables.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, sorted_by_index=True):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            lines = [line for line in plan.splitlines() if 'catalog_movieinstance' in line]
+            self.assertTrue(lines and all('USING INDEX' in line or 'USING COVERING INDEX' in line for line in lines),
+                            plan)
+            if sorted_by_index:
+                self.assertNotIn('TEMP B-TREE', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan on catalog_movieinstance', plan)
+
+    def test_loans_by_user_use_index(self):
+        view = LoanedMoviesByUserListView(request=self.request)
+        self.assertUsesIndex(view.get_queryset())
+
+    def test_all_loans_use_index(self):
+        view = LoanedMoviesAllListView(request=self.request)
+        self.assertUsesIndex(view.get_queryset())
+
+    def test_available_count_uses_index(self):
+        # The query counters.reconcile() runs for the available copies counter.
+        self.assertUsesIndex(MovieInstance.objects.filter(status__exact='a').order_by().values('movie'))
+
+    def test_status_counts_after_available_count(self):
+        # The partial index must not answer counts of the other statuses from a reused statement.
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        for status in 'aaddo':
+            MovieInstance.objects.create(movie=movie, imprint='Imprint', status=status)
+        self.assertEqual(MovieInstance.objects.filter(status='a').count(), 2)
+        self.assertEqual(MovieInstance.objects.filter(status='d').count(), 2)
+        self.assertEqual(MovieInstance.objects.filter(status='o').count(), 1)
+
+
+import csv
+import gzip
+import json
+
+
+class CatalogExportViewTest(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='2HJ1vRV0Z&3iD', is_staff=True)
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        genre = Genre.objects.create(name='Fantasy')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG',
+                                          author=author)
+        self.movie.genre.set([genre])
+        Movie.objects.create(title='No Copies', summary='My movie summary', isbn='HIJKLMN')
+        self.copy = MovieInstance.objects.create(movie=self.movie, imprint='Unlikely Imprint, 2016', status='o',
+                                                 borrower=self.staff, due_back=datetime.date(2020, 1, 2))
+
+    def test_redirect_if_not_staff(self):
+        response = self.client.get(reverse('catalog-export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv_export(self):
+        self.client.login(username='staff', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('catalog-export'))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], 'Movie Title')
+        self.assertEqual(rows[0]['author'], 'Smith, John')
+        self.assertEqual(rows[0]['genres'], 'Fantasy')
+        self.assertEqual(rows[0]['copy_id'], str(self.copy.id))
+        self.assertEqual(rows[0]['due_back'], '2020-01-02')
+        self.assertEqual(rows[0]['borrower'], 'staff')
+        self.assertEqual(rows[1]['title'], 'No Copies')
+        self.assertEqual(rows[1]['copy_id'], '')
+
+    def test_gzipped_ndjson_export(self):
+        self.client.login(username='staff', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('catalog-export'), {'format': 'ndjson', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('catalog.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['title'] for record in records], ['Movie Title', 'No Copies'])
+        self.assertEqual(records[0]['copies'][0]['status'], 'o')
+        self.assertEqual(records[1]['copies'], [])
+
+
+import tempfile
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import generic
+from catalog import caching
+
+
+@override_settings(CATALOG_PAGE_CACHE=True)
+class VersionedPageCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caching.stats.reset()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_anonymous_page_served_from_cache_without_queries(self):
+        response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('authors'))
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Smith, John')
+        self.assertEqual(caching.stats.hit_ratio('AuthorListView'), 0.5)
+
+    def test_change_invalidates_dependent_pages_only(self):
+        detail_url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        self.client.get(reverse('authors'))
+        self.client.get(detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG', author=self.author)
+        # The author list does not show movies, the author detail page does.
+        self.assertEqual(self.client.get(reverse('authors'))['X-Cache'], 'HIT')
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Movie Title')
+
+    def test_hit_has_the_headers_of_the_miss(self):
+        class HeaderView(caching.VersionedPageCacheMixin, generic.View):
+            cache_models = (Author,)
+
+            def get(self, request):
+                response = HttpResponse('page', content_type='text/plain; charset=utf-8')
+                response['Cache-Control'] = 'max-age=60'
+                patch_vary_headers(response, ['Accept-Language'])
+                return response
+
+        view = HeaderView.as_view()
+
+        def get():
+            request = RequestFactory().get('/headers/')
+            request.user = AnonymousUser()
+            return view(request)
+
+        miss, hit = get(), get()
+        self.assertEqual((miss['X-Cache'], hit['X-Cache']), ('MISS', 'HIT'))
+        del miss['X-Cache'], hit['X-Cache']
+        self.assertEqual(dict(hit.items()), dict(miss.items()))
+        self.assertEqual(hit['Cache-Control'], 'max-age=60')
+
+    def test_detail_hit_keeps_validators(self):
+        url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        miss = self.client.get(url)
+        hit = self.client.get(url)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        for header in ('ETag', 'Last-Modified', 'Vary', 'Content-Type'):
+            self.assertEqual(hit[header], miss[header], header)
+
+    def test_page_not_cached_for_logged_in_users(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.get(reverse('authors'))
+        response = self.client.get(reverse('authors'))
+        self.assertNotIn('X-Cache', response)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                      'LOCATION': directory}}
+            with self.settings(CACHES=file_cache):
+                self.assertEqual(self.client.get(reverse('authors'))['X-Cache'], 'MISS')
+                self.assertEqual(self.client.get(reverse('authors'))['X-Cache'], 'HIT')
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.author.last_name = 'Jones'
+                    self.author.save()
+                response = self.client.get(reverse('authors'))
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertContains(response, 'Jones, John')
+
+
+class ConditionalDetailViewTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG',
+                                          author=self.author)
+        self.movie_url = reverse('movie-detail', kwargs={'pk': self.movie.pk})
+        self.author_url = reverse('author-detail', kwargs={'pk': self.author.pk})
+
+    def assertNotModified(self, url, etag):
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_detail_pages_send_validators(self):
+        for url in (self.movie_url, self.author_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ETag', response)
+            self.assertIn('Last-Modified', response)
+
+    def test_not_modified_with_one_query(self):
+        for url in (self.movie_url, self.author_url):
+            self.assertNotModified(url, self.client.get(url)['ETag'])
+        last_modified = self.client.get(self.movie_url)['Last-Modified']
+        response = self.client.get(self.movie_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_movie_freshness_includes_copies_and_genres(self):
+        etag = self.client.get(self.movie_url)['ETag']
+        copy = MovieInstance.objects.create(movie=self.movie, imprint='Unlikely Imprint, 2016', status='a')
+        etag = self.assertModified(self.movie_url, etag)
+        copy.status = 'o'
+        copy.save()
+        etag = self.assertModified(self.movie_url, etag)
+        copy.delete()
+        etag = self.assertModified(self.movie_url, etag)
+        self.movie.genre.add(Genre.objects.create(name='Fantasy'))
+        etag = self.assertModified(self.movie_url, etag)
+        self.assertNotModified(self.movie_url, etag)
+
+    def test_movie_freshness_includes_language(self):
+        language = Language.objects.create(name='English')
+        self.movie.language = language
+        self.movie.save()
+        etag = self.client.get(self.movie_url)['ETag']
+        language.name = 'British English'
+        language.save()
+        etag = self.assertModified(self.movie_url, etag)
+        language.delete()
+        etag = self.assertModified(self.movie_url, etag)
+        self.assertNotModified(self.movie_url, etag)
+
+    def test_author_freshness_includes_movies(self):
+        etag = self.client.get(self.author_url)['ETag']
+        MovieInstance.objects.create(movie=self.movie, imprint='Unlikely Imprint, 2016', status='a')
+        etag = self.assertModified(self.author_url, etag)
+        self.movie.author = Author.objects.create(first_name='Jane', last_name='Doe')
+        self.movie.save()
+        etag = self.assertModified(self.author_url, etag)
+        self.assertNotModified(self.author_url, etag)
+
+    def test_missing_movie_is_404(self):
+        response = self.client.get(reverse('movie-detail', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        language = Language.objects.create(name='English')
+        fantasy = Genre.objects.create(name='Fantasy')
+        for movie_id in range(7):
+            movie = Movie.objects.create(title='Movie {0}'.format(movie_id // 2), summary='My movie summary',
+                                         isbn='ISBN{0}'.format(movie_id), author=author, language=language)
+            movie.genre.add(fantasy)
+        cls.movie = Movie.objects.order_by('title', 'id').first()
+        MovieInstance.objects.create(movie=cls.movie, imprint='Imprint', status='a')
+        MovieInstance.objects.create(movie=cls.movie, imprint='Imprint', status='o')
+
+    def walk(self, url):
+        """Follows the next links from url and returns the results of every page."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append(data['results'])
+            url = data['next']
+        return pages
+
+    def test_movie_pages(self):
+        pages = self.walk(reverse('api-movies') + '?limit=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        expected = list(Movie.objects.order_by('title', 'author_id', 'id').values_list('pk', flat=True))
+        self.assertEqual([item['id'] for item in sum(pages, [])], expected)
+        self.assertEqual(pages[0][0], {'id': self.movie.pk, 'title': 'Movie 0', 'isbn': self.movie.isbn,
+                                       'author_id': self.movie.author_id, 'language': 'English',
+                                       'genres': ['Fantasy']})
+
+    def test_previous_link(self):
+        first = self.client.get(reverse('api-movies') + '?limit=3').json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('api-movies') + '?fields=title&limit=1')
+        self.assertEqual(response.json()['results'], [{'title': 'Movie 0'}])
+        response = self.client.get(reverse('api-authors') + '?fields=last_name,date_of_birth')
+        self.assertEqual(response.json()['results'], [{'last_name': 'Smith', 'date_of_birth': None}])
+
+    def test_availability(self):
+        response = self.client.get(reverse('api-availability') + '?limit=1')
+        self.assertEqual(response.json()['results'],
+                         [{'id': self.movie.pk, 'title': 'Movie 0', 'total_copies': 2, 'available_copies': 1}])
+
+    def test_genres(self):
+        response = self.client.get(reverse('api-genres'))
+        self.assertEqual(response.json(), {'results': [{'id': Genre.objects.get().pk, 'name': 'Fantasy'}],
+                                           'next': None, 'previous': None})
+
+    def test_bad_requests(self):
+        for query in ('fields=password', 'limit=abc', 'limit=0', 'cursor=garbage'):
+            response = self.client.get(reverse('api-movies') + '?' + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+
+
+from django.contrib.admin import helpers
+
+
+class BulkRenewalTest(TestCase):
+
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD', is_staff=True)
+        self.librarian.user_permissions.add(Permission.objects.get(name='Set movie as returned'),
+                                            *Permission.objects.filter(codename__endswith='_movieinstance'))
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', isbn='ABCDEFG')
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        self.loans = [MovieInstance.objects.create(movie=movie, imprint='Unlikely Imprint, 2016', due_back=due_back,
+                                                   borrower=self.borrower, status='o') for _ in range(3)]
+        self.available = MovieInstance.objects.create(movie=movie, imprint='Unlikely Imprint, 2016', status='a')
+        self.renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+
+    def due_dates(self):
+        return [MovieInstance.objects.get(pk=copy.pk).due_back for copy in self.loans + [self.available]]
+
+    def test_forbidden_without_permission(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('renew-movies-librarian'),
+                                    {'renewal_date': self.renewal_date, 'renew_all': 'on'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_renews_selected_loans_with_one_update(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        data = {'renewal_date': self.renewal_date, 'instance': [self.loans[0].pk, self.available.pk]}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('renew-movies-librarian'), data)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "catalog_movieinstance"')]
+        self.assertEqual(len(updates), 1)
+        self.assertRedirects(response, reverse('all-borrowed'))
+        self.assertEqual(self.due_dates()[:2], [self.renewal_date, self.loans[1].due_back])
+        self.assertIsNone(self.due_dates()[3])
+
+    def test_renews_all_loans(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.post(reverse('renew-movies-librarian'),
+                                    {'renewal_date': self.renewal_date, 'renew_all': 'on'}, follow=True)
+        self.assertContains(response, 'Renewed 3 loans until')
+        self.assertEqual(self.due_dates(), [self.renewal_date] * 3 + [None])
+
+    def test_invalid_date_or_selection_renews_nothing(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        for data in ({'renewal_date': datetime.date.today() - datetime.timedelta(days=1), 'renew_all': 'on'},
+                     {'renewal_date': self.renewal_date},
+                     {'renewal_date': self.renewal_date, 'instance': ['not-a-uuid']}):
+            response = self.client.post(reverse('renew-movies-librarian'), data)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors)
+        self.assertEqual(self.due_dates(), [copy.due_back for copy in self.loans] + [None])
+
+    def test_admin_action(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        url = reverse('admin:catalog_movieinstance_changelist')
+        data = {'action': 'renew_loans', helpers.ACTION_CHECKBOX_NAME: [self.loans[0].pk, self.loans[1].pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, '2 of the selected')
+        response = self.client.post(url, {**data, 'apply': '1', 'renewal_date': self.renewal_date}, follow=True)
+        self.assertContains(response, 'Renewed 2 loans until')
+        self.assertEqual(self.due_dates()[:3], [self.renewal_date, self.renewal_date, self.loans[2].due_back])
+
+
+from catalog import metrics
+
+
+class CatalogMetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD', is_staff=True)
+        Author.objects.create(first_name='John', last_name='Smith')
+
+    def scrape(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('catalog-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_requests_by_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('authors'))
+        self.client.get('/catalog/no-such-page/')
+        lines = self.scrape().splitlines()
+        self.assertIn('catalog_request_duration_seconds_count{view="authors"} 3', lines)
+        self.assertIn('catalog_request_duration_seconds_bucket{view="authors",le="+Inf"} 3', lines)
+        self.assertIn('catalog_request_duration_seconds_count{view="unresolved"} 1', lines)
+        # The author list page runs two queries: the count and the page of authors.
+        self.assertIn('catalog_db_queries_sum{view="authors"} 6', lines)
+        self.assertIn('catalog_db_queries_bucket{view="authors",le="1"} 0', lines)
+        self.assertIn('catalog_db_queries_bucket{view="authors",le="2"} 3', lines)
+
+    def test_records_db_and_template_time(self):
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('api-genres'))
+        values = dict(line.rsplit(' ', 1) for line in self.scrape().splitlines() if not line.startswith('#'))
+        self.assertGreater(float(values['catalog_db_duration_seconds_total{view="authors"}']), 0)
+        self.assertGreater(float(values['catalog_template_duration_seconds_total{view="authors"}']), 0)
+        self.assertEqual(float(values['catalog_template_duration_seconds_total{view="api-genres"}']), 0)
+
+    def test_staff_only(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('catalog-metrics'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/admin/login/'))
+
+
+import unittest
+
+from catalog import autocomplete
+
+
+class AutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_superuser(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.borrower = User.objects.create_user(username='Alice', password='2HJ1vRV0Z&3iD')
+        User.objects.create_user(username='bob', password='2HJ1vRV0Z&3iD')
+        cls.scott = Author.objects.create(first_name='Ridley', last_name='Scott')
+        Author.objects.create(first_name='Martin', last_name='Scorsese')
+        Author.objects.create(first_name='Agnes', last_name='Varda')
+        cls.language = Language.objects.create(name='English')
+
+    def setUp(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+    def get_json(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_search_ignores_case(self):
+        data = self.get_json('autocomplete-authors', term='sco')
+        self.assertEqual([item['text'] for item in data['results']], ['Scorsese, Martin', 'Scott, Ridley'])
+        self.assertEqual(data['pagination'], {'more': False})
+        # First names match too.
+        data = self.get_json('autocomplete-authors', term='RID')
+        self.assertEqual(data['results'], [{'id': str(self.scott.pk), 'text': 'Scott, Ridley'}])
+        self.assertEqual(self.get_json('autocomplete-authors', term='cott')['results'], [])
+
+    def test_pages(self):
+        Genre.objects.bulk_create([Genre(name='Genre {0:02d}'.format(number)) for number in range(25)])
+        first = self.get_json('autocomplete-genres', term='genre')
+        self.assertEqual(len(first['results']), autocomplete.PAGE_SIZE)
+        self.assertTrue(first['pagination']['more'])
+        second = self.get_json('autocomplete-genres', term='genre', page=2)
+        self.assertEqual([item['text'] for item in second['results']], ['Genre 20', 'Genre 21', 'Genre 22',
+                                                                       'Genre 23', 'Genre 24'])
+        self.assertFalse(second['pagination']['more'])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Checks the SQLite query plan')
+    def test_prefix_search_uses_indexes(self):
+        plan = autocomplete.prefix_search(Author.objects.all(), ('last_name', 'first_name'), 'sco').explain()
+        self.assertIn('catalog_author_last_upper_idx', plan)
+        self.assertIn('catalog_author_first_upper_idx', plan)
+        self.assertNotIn('SCAN', plan)
+        plan = autocomplete.prefix_search(User.objects.all(), ('username',), 'al').explain()
+        self.assertIn('catalog_user_username_upper_idx', plan)
+
+    def test_movie_form_renders_only_selected_choices(self):
+        movie = Movie.objects.create(title='Alien', summary='Space horror', isbn='1', author=self.scott,
+                                     language=self.language)
+        response = self.client.get(reverse('movie-update', kwargs={'pk': movie.pk}))
+        self.assertContains(response, 'data-ajax--url="{0}"'.format(reverse('autocomplete-authors')))
+        self.assertContains(response, '<option value="{0}" selected>Scott, Ridley</option>'.format(self.scott.pk),
+                            html=True)
+        self.assertNotContains(response, 'Varda')
+
+        # Loading the form does not depend on the number of authors.
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('movie-create'))
+        num_queries = len(context.captured_queries)
+        Author.objects.bulk_create([Author(first_name='First', last_name='Last {0}'.format(n)) for n in range(20)])
+        with self.assertNumQueries(num_queries):
+            self.client.get(reverse('movie-create'))
+
+    def test_movie_form_saves_autocompleted_values(self):
+        genre = Genre.objects.create(name='Horror')
+        response = self.client.post(reverse('movie-create'), {
+            'title': 'Alien', 'summary': 'Space horror', 'isbn': '1', 'author': self.scott.pk,
+            'genre': [genre.pk], 'language': self.language.pk})
+        movie = Movie.objects.get(isbn='1')
+        self.assertRedirects(response, movie.get_absolute_url())
+        self.assertEqual((movie.author, list(movie.genre.all())), (self.scott, [genre]))
+
+    def test_admin_autocompletes_borrowers_by_username_prefix(self):
+        data = self.get_json('admin:autocomplete', term='al', app_label='catalog', model_name='movieinstance',
+                             field_name='borrower')
+        self.assertEqual(data['results'], [{'id': str(self.borrower.pk), 'text': 'Alice'}])
+
+    def test_admin_changelist_search_unchanged(self):
+        # The changelist still finds names containing the term, not only starting with it.
+        response = self.client.get(reverse('admin:catalog_author_changelist'), {'q': 'cott'})
+        self.assertContains(response, 'Scott')
@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, autocomplete, views
+
+# The home page and the lists have async versions running their queries concurrently.
+if getattr(settings, 'CATALOG_ASYNC_VIEWS', False):
+    from .async_views import author_list, index, movie_list
+else:
+    index, movie_list, author_list = views.index, views.MovieListView.as_view(), views.AuthorListView.as_view()
 
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('movies/', views.MovieListView.as_view(), name='movies'),
+    path('', index, name='index'),
+    path('movies/', movie_list, name='movies'),
     path('movie/<int:pk>', views.MovieDetailView.as_view(), name='movie-detail'),
-    path('authors/', views.AuthorListView.as_view(), name='authors'),
+    path('search/', views.movie_search, name='movie-search'),
+    path('authors/', author_list, name='authors'),
     path('author/<int:pk>',
          views.AuthorDetailView.as_view(), name='author-detail'),
 ]
@@ -22,6 +30,7 @@ urlpatterns += [
 # Add URLConf for librarian to renew a movie.
 urlpatterns += [
     path('movie/<uuid:pk>/renew/', views.renew_movie_librarian, name='renew-movie-librarian'),
+    path('borrowed/renew/', views.renew_movies_librarian, name='renew-movies-librarian'),
 ]
 
 
@@ -38,3 +47,29 @@ urlpatterns += [
     path('movie/<int:pk>/update/', views.MovieUpdate.as_view(), name='movie-update'),
     path('movie/<int:pk>/delete/', views.MovieDelete.as_view(), name='movie-delete'),
 ]
+
+# Add URLConf for staff to export the catalog.
+urlpatterns += [
+    path('export/', views.export_catalog, name='catalog-export'),
+]
+
+# Add URLConf for staff to scrape the request metrics.
+urlpatterns += [
+    path('metrics/', views.catalog_metrics, name='catalog-metrics'),
+]
+
+# Add URLConf for the read-only JSON API.
+urlpatterns += [
+    path('api/movies/', api.resource_list, {'resource_name': 'movies'}, name='api-movies'),
+    path('api/authors/', api.resource_list, {'resource_name': 'authors'}, name='api-authors'),
+    path('api/genres/', api.resource_list, {'resource_name': 'genres'}, name='api-genres'),
+    path('api/availability/', api.resource_list, {'resource_name': 'availability'}, name='api-availability'),
+]
+
+# Add URLConf for the autocomplete widgets of the movie forms.
+urlpatterns += [
+    path('autocomplete/authors/', autocomplete.autocomplete, {'source_name': 'authors'}, name='autocomplete-authors'),
+    path('autocomplete/genres/', autocomplete.autocomplete, {'source_name': 'genres'}, name='autocomplete-genres'),
+    path('autocomplete/languages/', autocomplete.autocomplete, {'source_name': 'languages'},
+         name='autocomplete-languages'),
+]
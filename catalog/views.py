@@ -2,21 +2,23 @@ from django.shortcuts import render
 
 # Create your views here.
 
-from .models import Movie, Author, MovieInstance, Genre
+from .models import Movie, Author, MovieInstance, Genre, Language
+from . import counters, visits
 
 
 def index(request):
     """View function for home page of site."""
-    # Generate counts of some of the main objects
-    num_movies = Movie.objects.all().count()
-    num_instances = MovieInstance.objects.all().count()
+    # Read the materialized counts of the main objects (kept current by catalog.signals)
+    counts = counters.read()
+    num_movies = counts[counters.NUM_MOVIES]
+    num_instances = counts[counters.NUM_INSTANCES]
     # Available copies of movies
-    num_instances_available = MovieInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()  # The 'all()' is implied by default.
+    num_instances_available = counts[counters.NUM_INSTANCES_AVAILABLE]
+    num_authors = counts[counters.NUM_AUTHORS]
 
     # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits+1
+    # (see catalog.visits for the buffered mode that avoids a session write per visit)
+    num_visits = visits.count_visit(request)
 
     # Render the HTML template index.html with the data in the context variable.
     return render(
@@ -28,29 +30,140 @@ def index(request):
     )
 
 
+from django.db.models import Max
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
 
+from .caching import VersionedPageCacheMixin
+from .pagination import CursorPaginationMixin
 
-class MovieListView(generic.ListView):
+
+class MovieListView(VersionedPageCacheMixin, CursorPaginationMixin, generic.ListView):
     """Generic class-based view for a list of movies."""
     model = Movie
     paginate_by = 10
+    cursor_ordering = ('title', 'author_id', 'id')
+    cache_models = (Movie, Author, MovieInstance)
+
+    def get_queryset(self):
+        return Movie.objects.select_related('author')
+
+
+def latest(*timestamps):
+    """Returns the latest of the given timestamps, ignoring missing ones."""
+    return max((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+
+
+def memoized_on_request(func):
+    """Caches the result of a last_modified function, which condition() calls for both headers."""
+    def wrapper(request, pk):
+        if not hasattr(request, '_catalog_last_modified'):
+            request._catalog_last_modified = func(request, pk)
+        return request._catalog_last_modified
+    return wrapper
+
+
+@memoized_on_request
+def movie_last_modified(request, pk):
+    """Returns when the movie detail page last changed: the movie, its author or one of its copies."""
+    rows = (Movie.objects.filter(pk=pk).order_by().values('updated_at', 'author__updated_at')
+            .annotate(copies_updated_at=Max('movieinstance__updated_at'))
+            .values_list('updated_at', 'author__updated_at', 'copies_updated_at'))
+    return latest(*rows[0]) if rows else None
+
+
+@memoized_on_request
+def author_last_modified(request, pk):
+    """Returns when the author detail page last changed: the author, its movies or their copies."""
+    rows = (Author.objects.filter(pk=pk).order_by().values('updated_at')
+            .annotate(movies_updated_at=Max('movie__updated_at'),
+                      copies_updated_at=Max('movie__movieinstance__updated_at'))
+            .values_list('updated_at', 'movies_updated_at', 'copies_updated_at'))
+    return latest(*rows[0]) if rows else None
+
 
+def last_modified_etag(last_modified_func):
+    """Returns an ETag function based on the (microsecond precision) last modification time."""
+    def etag(request, pk):
+        last_modified = last_modified_func(request, pk)
+        return '{0}-{1}'.format(pk, last_modified.timestamp()) if last_modified else None
+    return etag
 
-class MovieDetailView(generic.DetailView):
+
+@method_decorator(vary_on_cookie, name='dispatch')
+@method_decorator(condition(etag_func=last_modified_etag(movie_last_modified),
+                            last_modified_func=movie_last_modified), name='dispatch')
+class MovieDetailView(VersionedPageCacheMixin, generic.DetailView):
     """Generic class-based detail view for a movie."""
     model = Movie
+    cache_models = (Movie, Author, Genre, Language, MovieInstance)
+
+    def get_queryset(self):
+        # Load the author, language, genres and copies up front, so the number of
+        # queries does not depend on how many copies the movie has.
+        return Movie.objects.select_related('author', 'language').prefetch_related('genre', 'movieinstance_set')
+
+
+from . import search
+from .forms import MovieSearchForm
+
+SEARCH_PAGE_SIZE = 20
+
+
+def movie_search(request):
+    """View function for full-text search of movies (see catalog.search)."""
+    form = MovieSearchForm(request.GET or None)
+    query = ''
+    movies = []
+    page = 1
+    has_next = False
+    if form.is_valid():
+        query = form.cleaned_data['q']
+        page = form.cleaned_data['page'] or 1
+        # Fetch one extra result to find out whether there is a next page.
+        results = search.search(query, limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE)
+        has_next = len(results) > SEARCH_PAGE_SIZE
+        results = results[:SEARCH_PAGE_SIZE]
+        movies_by_id = Movie.objects.select_related('author').in_bulk([result.movie_id for result in results])
+        for result in results:
+            if result.movie_id in movies_by_id:
+                movie = movies_by_id[result.movie_id]
+                movie.search_snippet = result.snippet
+                movies.append(movie)
+
+    context = {
+        'form': form,
+        'movie_list': movies,
+        'query': query,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_next else None,
+    }
+    return render(request, 'catalog/movie_search.html', context)
 
 
-class AuthorListView(generic.ListView):
+class AuthorListView(VersionedPageCacheMixin, CursorPaginationMixin, generic.ListView):
     """Generic class-based list view for a list of authors."""
     model = Author
     paginate_by = 10
+    cursor_ordering = ('last_name', 'first_name', 'id')
+    cache_models = (Author,)
 
 
-class AuthorDetailView(generic.DetailView):
+@method_decorator(vary_on_cookie, name='dispatch')
+@method_decorator(condition(etag_func=last_modified_etag(author_last_modified),
+                            last_modified_func=author_last_modified), name='dispatch')
+class AuthorDetailView(VersionedPageCacheMixin, generic.DetailView):
     """Generic class-based detail view for an author."""
     model = Author
+    cache_models = (Author, Movie, MovieInstance)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The copy counts are stored on the movies, so listing them needs no aggregation.
+        context['movie_list'] = self.object.movie_set.all()
+        return context
 
 
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -63,7 +176,8 @@ class LoanedMoviesByUserListView(LoginRequiredMixin, generic.ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return MovieInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return (MovieInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+                .select_related('movie').order_by('due_back'))
 
 
 # Added as part of challenge!
@@ -78,7 +192,12 @@ class LoanedMoviesAllListView(PermissionRequiredMixin, generic.ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return MovieInstance.objects.filter(status__exact='o').order_by('due_back')
+        return MovieInstance.objects.filter(status__exact='o').select_related('movie', 'borrower').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['renew_form'] = BulkRenewMovieForm(initial={'renewal_date': default_renewal_date()})
+        return context
 
 
 from django.shortcuts import get_object_or_404
@@ -88,14 +207,20 @@ import datetime
 from django.contrib.auth.decorators import login_required, permission_required
 
 # from .forms import RenewMovieForm
-from catalog.forms import RenewMovieForm
+from catalog.forms import BulkRenewMovieForm, MovieForm, RenewMovieForm
+from django.contrib import messages
+from catalog import loans
+
+
+def default_renewal_date():
+    return datetime.date.today() + datetime.timedelta(weeks=3)
 
 
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_movie_librarian(request, pk):
     """View function for renewing a specific MovieInstance by librarian."""
-    movie_instance = get_object_or_404(MovieInstance, pk=pk)
+    movie_instance = get_object_or_404(MovieInstance.objects.select_related('movie', 'borrower'), pk=pk)
 
     # If this is a POST request then process the Form data
     if request.method == 'POST':
@@ -105,17 +230,15 @@ def renew_movie_librarian(request, pk):
 
         # Check if the form is valid:
         if form.is_valid():
-            # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            movie_instance.due_back = form.cleaned_data['renewal_date']
-            movie_instance.save()
-
-            # redirect to a new URL:
-            return HttpResponseRedirect(reverse('all-borrowed'))
+            # Update only due_back, and only while the copy is still on loan, so a concurrent return is not undone.
+            if loans.renew(MovieInstance.objects.filter(pk=pk), form.cleaned_data['renewal_date'], request.user):
+                # redirect to a new URL:
+                return HttpResponseRedirect(reverse('all-borrowed'))
+            form.add_error(None, 'This movie is no longer on loan.')
 
     # If this is a GET (or any other method) create the default form
     else:
-        proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
-        form = RenewMovieForm(initial={'renewal_date': proposed_renewal_date})
+        form = RenewMovieForm(initial={'renewal_date': default_renewal_date()})
 
     context = {
         'form': form,
@@ -125,6 +248,29 @@ def renew_movie_librarian(request, pk):
     return render(request, 'catalog/movie_renew_librarian.html', context)
 
 
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def renew_movies_librarian(request):
+    """View function for renewing the selected loans, or all of them, by librarian.
+
+    The date is validated once and applied with a single UPDATE (see catalog.loans).
+    """
+    if request.method == 'POST':
+        form = BulkRenewMovieForm(request.POST)
+        if form.is_valid():
+            on_loan = MovieInstance.objects.all()
+            if not form.cleaned_data['renew_all']:
+                on_loan = on_loan.filter(id__in=form.cleaned_data['instance'])
+            renewed = loans.renew(on_loan, form.cleaned_data['renewal_date'], request.user)
+            messages.success(request, 'Renewed {0} loan{1} until {2}.'.format(
+                renewed, '' if renewed == 1 else 's', form.cleaned_data['renewal_date']))
+            return HttpResponseRedirect(reverse('all-borrowed'))
+    else:
+        form = BulkRenewMovieForm(initial={'renewal_date': default_renewal_date()})
+
+    return render(request, 'catalog/movie_renew_librarian_bulk.html', {'form': form})
+
+
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from .models import Author
@@ -152,13 +298,13 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
 # Classes created for the forms challenge
 class MovieCreate(PermissionRequiredMixin, CreateView):
     model = Movie
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = MovieForm
     permission_required = 'catalog.can_mark_returned'
 
 
 class MovieUpdate(PermissionRequiredMixin, UpdateView):
     model = Movie
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = MovieForm
     permission_required = 'catalog.can_mark_returned'
 
 
@@ -166,3 +312,43 @@ class MovieDelete(PermissionRequiredMixin, DeleteView):
     model = Movie
     success_url = reverse_lazy('movies')
     permission_required = 'catalog.can_mark_returned'
+
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import StreamingHttpResponse
+
+from . import export
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+@staff_member_required
+def export_catalog(request):
+    """View function streaming an export of the whole catalog to staff (see catalog.export)."""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in export.FORMATS:
+        export_format = 'csv'
+    gzip = request.GET.get('gzip') == '1'
+    filename = 'catalog.{0}'.format(export_format)
+    content_type = EXPORT_CONTENT_TYPES[export_format]
+    if gzip:
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(export.export_catalog(export_format, gzip=gzip), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
+from django.http import HttpResponse
+
+from . import metrics
+
+
+@staff_member_required
+def catalog_metrics(request):
+    """View function serving the request metrics (see catalog.metrics) for Prometheus to scrape."""
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,94 @@
+"""Counting of home page visits per visitor.
+
+By default every visit to the index page is stored straight into the visitor's
+session, which costs one session write per page view. With
+CATALOG_VISIT_COUNTING = 'buffered' only the first visit writes the session;
+later visits are accumulated in an in-process buffer and written to the session
+store in batches (every CATALOG_VISIT_FLUSH_EVERY visits or
+CATALOG_VISIT_FLUSH_INTERVAL seconds, whichever comes first). The flush runs
+when a request finishes, after its response has been sent, so no visitor waits
+for it; a flush writes at most CATALOG_VISIT_FLUSH_EVERY sessions.
+
+Buffered counting needs a server side session engine (database, cache, file),
+because the flush writes to sessions outside of the visitor's request.
+"""
+import atexit
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+
+class VisitBuffer:
+    """In-process buffer of pending visit increments, keyed by session key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, session_key):
+        """Buffers one visit for the session and returns its number of pending visits."""
+        with self._lock:
+            self._pending[session_key] = self._pending.get(session_key, 0) + 1
+            self._buffered += 1
+            return self._pending[session_key]
+
+    def should_flush(self):
+        """Returns True when the buffer is full or its flush interval has elapsed."""
+        flush_every = getattr(settings, 'CATALOG_VISIT_FLUSH_EVERY', 100)
+        flush_interval = getattr(settings, 'CATALOG_VISIT_FLUSH_INTERVAL', 30)
+        return (self._buffered >= flush_every
+                or (self._buffered and time.monotonic() - self._last_flush >= flush_interval))
+
+    def flush(self):
+        """Adds the pending visits to the stored sessions and returns the number of sessions written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._buffered = 0
+            self._last_flush = time.monotonic()
+
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        written = 0
+        for session_key, visits in pending.items():
+            session = SessionStore(session_key=session_key)
+            num_visits = session.get('num_visits', 1)
+            if session.session_key is None:
+                # The session has expired or was cycled (e.g. on login) in the meantime.
+                continue
+            session['num_visits'] = num_visits + visits
+            try:
+                session.save(must_create=False)
+            except UpdateError:
+                continue
+            written += 1
+        return written
+
+
+buffer = VisitBuffer()
+atexit.register(buffer.flush)
+
+
+def count_visit(request):
+    """Records a visit to the home page and returns the visitor's number of visits (including this one)."""
+    num_visits = request.session.get('num_visits', 1)
+    session_key = request.session.session_key
+    if getattr(settings, 'CATALOG_VISIT_COUNTING', 'session') != 'buffered' or session_key is None:
+        # Store the count in the session (always done on the first visit, to create the session).
+        request.session['num_visits'] = num_visits + 1
+        return num_visits
+
+    pending = buffer.add(session_key)
+    return num_visits + pending - 1
+
+
+@receiver(request_finished)
+def flush_visits(sender, **kwargs):
+    """Writes the buffered visits out once the response has been sent, when a flush is due."""
+    if buffer.should_flush():
+        buffer.flush()
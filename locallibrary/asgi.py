@@ -0,0 +1,18 @@
+"""
+ASGI config for locallibrary project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Set CATALOG_ASYNC_VIEWS=True to serve the catalog's async views (see
+catalog/async_views.py), e.g. with ``uvicorn locallibrary.asgi:application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+
+application = get_asgi_application()
@@ -46,8 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,7 +62,7 @@ ROOT_URLCONF = 'locallibrary.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'catalog.metrics.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,6 +77,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'locallibrary.wsgi.application'
+ASGI_APPLICATION = 'locallibrary.asgi.application'
 
 
 # Database
@@ -82,7 +85,9 @@ WSGI_APPLICATION = 'locallibrary.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # The stock SQLite backend tuned for several workers (WAL, pragmas, BEGIN IMMEDIATE);
+        # see catalog/sqlite3/. The pragmas can be overridden with CATALOG_SQLITE_PRAGMAS.
+        'ENGINE': 'catalog.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
@@ -128,11 +133,56 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 
 
+# Home page visit counting: 'session' writes the visitor's session on every visit,
+# 'buffered' batches the writes (see catalog/visits.py).
+CATALOG_VISIT_COUNTING = os.environ.get('CATALOG_VISIT_COUNTING', 'session')
+CATALOG_VISIT_FLUSH_EVERY = 100  # buffered visits
+CATALOG_VISIT_FLUSH_INTERVAL = 30  # seconds
+
+# Use keyset (cursor) pagination instead of page numbers in the movie and author lists
+# (see catalog/pagination.py).
+CATALOG_CURSOR_PAGINATION = os.environ.get('CATALOG_CURSOR_PAGINATION', '') == 'True'
+
+# Cache the rendered movie and author pages for anonymous visitors, keyed on per-model
+# version numbers bumped on every change (see catalog/caching.py).
+CATALOG_PAGE_CACHE = os.environ.get('CATALOG_PAGE_CACHE', '') == 'True'
+CATALOG_PAGE_CACHE_ALIAS = 'default'
+CATALOG_PAGE_CACHE_TIMEOUT = 24 * 60 * 60  # seconds, only to expire unreachable entries
+
+# Record per-view latency, query and template metrics, served to staff in the
+# Prometheus text format at /catalog/metrics/ (see catalog/metrics.py).
+CATALOG_METRICS = os.environ.get('CATALOG_METRICS', 'True') == 'True'
+
+# Serve the home page and the movie and author lists with async views that run their
+# independent queries concurrently; best under ASGI (see catalog/async_views.py).
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '') == 'True'
+CATALOG_ASYNC_QUERY_THREADS = 8  # threads (and database connections) per process for their queries
+
+
+
 # Heroku: Update database configuration from $DATABASE_URL.
 import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas for catalog reads: comma separated database URLs (see catalog/routers.py).
+CATALOG_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('CATALOG_REPLICA_URLS', '').split(',')), start=1):
+    alias = 'replica{0}'.format(number)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=500)
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['ENGINE'] = 'catalog.sqlite3'
+    # Tests read the replicas' data from the test primary.
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    CATALOG_REPLICAS.append(alias)
+# A second database for the router tests (catalog/tests/test_routers.py). Nothing is routed to it
+# unless it is listed in CATALOG_REPLICAS, and it is only connected to when used. Its test
+# database is a separate in-memory SQLite database, not a mirror of the primary's.
+DATABASES['replica'] = {'ENGINE': 'catalog.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'}
+CATALOG_REPLICA_APPS = ['catalog']
+CATALOG_REPLICA_PIN_SECONDS = 5  # how long a client reads from the primary after writing
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+
 
 
 # Static files (CSS, JavaScript, Images)